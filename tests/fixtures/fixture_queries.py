@@ -0,0 +1,47 @@
+import pytest
+from django.test import Client
+
+from posts.tests.utils import QueryRecorder, query_problems
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers',
+        'allow_duplicate_queries: не проверять тест на повторяющиеся запросы'
+    )
+
+
+@pytest.fixture
+def query_checker():
+    """Проверка страницы по бюджету запросов и на N+1: check(client, url)."""
+    def check(client, url, data=None, budget=None):
+        problems = query_problems(client, url, data, budget)
+        if problems:
+            pytest.fail('\n'.join(problems), pytrace=False)
+    return check
+
+
+@pytest.fixture(autouse=True)
+def detect_duplicate_queries(request, monkeypatch):
+    """
+    Записывает запросы каждого GET через тестовый клиент и роняет тест,
+    если внутри одного ответа повторяется одна и та же форма SQL.
+    """
+    if request.node.get_closest_marker('allow_duplicate_queries'):
+        yield
+        return
+
+    problems = []
+    original_get = Client.get
+
+    def get(self, path, *args, **kwargs):
+        with QueryRecorder() as recorder:
+            response = original_get(self, path, *args, **kwargs)
+        for shape, count in recorder.duplicates().items():
+            problems.append(f'GET {path}: запрос повторён {count} раз: {shape}')
+        return response
+
+    monkeypatch.setattr(Client, 'get', get)
+    yield
+    if problems:
+        pytest.fail('\n'.join(problems), pytrace=False)
@@ -0,0 +1,240 @@
+"""
+Кеш-бэкенд для Redis без сторонних зависимостей.
+
+Говорит на протоколе Redis напрямую и держит пул соединений, общий
+для потоков процесса. LOCATION вида redis://host:port/db, либо fake://
+для заглушки core.redis_stub, запущенной внутри процесса.
+"""
+import pickle
+import queue
+import socket
+import threading
+from urllib.parse import urlparse
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .resp import RespError, encode_command, read_reply
+
+
+# INCRBY создал бы отсутствующий ключ, поэтому проверка и увеличение
+# выполняются на сервере одним скриптом.
+INCR_SCRIPT = (
+    "if redis.call('EXISTS', KEYS[1]) == 1 then "
+    "return redis.call('INCRBY', KEYS[1], ARGV[1]) end"
+)
+
+
+class _Connection:
+    def __init__(self, host, port, db, socket_timeout):
+        self.sock = socket.create_connection((host, port), socket_timeout)
+        self.stream = self.sock.makefile('rb')
+        if db:
+            self.execute('SELECT', db)
+
+    def execute(self, *args):
+        return self.pipeline([args])[0]
+
+    def pipeline(self, commands):
+        self.sock.sendall(b''.join(encode_command(*args) for args in commands))
+        replies = [read_reply(self.stream) for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    def close(self):
+        self.stream.close()
+        self.sock.close()
+
+
+class ConnectionPool:
+    """
+    Не больше max_connections соединений одновременно: остальные потоки
+    ждут свободное до socket_timeout секунд.
+    """
+
+    def __init__(self, host, port, db=0, max_connections=10,
+                 socket_timeout=5):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.socket_timeout = socket_timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.socket_timeout):
+            raise ConnectionError('Все соединения с Redis заняты')
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return _Connection(
+                self.host, self.port, self.db, self.socket_timeout
+            )
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, connection):
+        self._idle.put_nowait(connection)
+        self._slots.release()
+
+    def _discard(self, connection):
+        connection.close()
+        self._slots.release()
+
+    def pipeline(self, commands):
+        connection = self._acquire()
+        try:
+            replies = connection.pipeline(commands)
+        except RespError:
+            self._release(connection)
+            raise
+        except BaseException:
+            self._discard(connection)
+            raise
+        self._release(connection)
+        return replies
+
+    def execute(self, *args):
+        return self.pipeline([args])[0]
+
+    def disconnect(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class RedisCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        url = urlparse(location)
+        if url.scheme == 'fake':
+            from .redis_stub import get_shared_server
+
+            url = urlparse(get_shared_server().location)
+        self._pool = ConnectionPool(
+            url.hostname or '127.0.0.1',
+            url.port or 6379,
+            db=int(url.path.strip('/') or 0),
+            max_connections=options.get('MAX_CONNECTIONS', 10),
+            socket_timeout=options.get('SOCKET_TIMEOUT', 5),
+        )
+
+    def _milliseconds(self, timeout):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return None
+        return int(timeout * 1000)
+
+    @staticmethod
+    def _dumps(value):
+        # Целые числа храним как есть, чтобы работал INCRBY.
+        if type(value) is int:
+            return str(value).encode()
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _loads(value):
+        if value is None:
+            return None
+        if value[:1] == b'\x80':
+            return pickle.loads(value)
+        return int(value)
+
+    def _set_command(self, key, value, timeout, only_new=False):
+        command = ['SET', key, self._dumps(value)]
+        milliseconds = self._milliseconds(timeout)
+        if milliseconds is not None:
+            command += ['PX', max(milliseconds, 1)]
+        if only_new:
+            command.append('NX')
+        return command
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        return self._pool.execute(
+            *self._set_command(key, value, timeout, only_new=True)
+        ) is not None
+
+    def get(self, key, default=None, version=None):
+        value = self._pool.execute('GET', self._key(key, version))
+        return default if value is None else self._loads(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        if self._milliseconds(timeout) == 0:
+            self._pool.execute('DEL', key)
+            return
+        self._pool.execute(*self._set_command(key, value, timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        milliseconds = self._milliseconds(timeout)
+        if milliseconds is None:
+            _, exists = self._pool.pipeline([
+                ('PERSIST', key), ('EXISTS', key)
+            ])
+            return bool(exists)
+        return bool(self._pool.execute('PEXPIRE', key, max(milliseconds, 1)))
+
+    def delete(self, key, version=None):
+        self._pool.execute('DEL', self._key(key, version))
+
+    def has_key(self, key, version=None):
+        return bool(self._pool.execute('EXISTS', self._key(key, version)))
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self._pool.execute(
+            'MGET', *(self._key(key, version) for key in keys)
+        )
+        return {
+            key: self._loads(value)
+            for key, value in zip(keys, values)
+            if value is not None
+        }
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if not data:
+            return []
+        if self._milliseconds(timeout) == 0:
+            self.delete_many(data, version)
+            return []
+        self._pool.pipeline([
+            self._set_command(self._key(key, version), value, timeout)
+            for key, value in data.items()
+        ])
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._pool.execute('DEL', *keys)
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        value = self._pool.execute('EVAL', INCR_SCRIPT, 1, key, delta)
+        if value is None:
+            raise ValueError("Key '%s' not found" % key)
+        return value
+
+    def clear(self):
+        self._pool.execute('FLUSHDB')
+
+    def close(self, **kwargs):
+        # Соединения возвращаются в пул и переживают запрос.
+        pass
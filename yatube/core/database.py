@@ -0,0 +1,48 @@
+"""
+Настройка соединений SQLite.
+
+На каждом новом соединении выполняются PRAGMA из SQLITE_PRAGMAS:
+журнал WAL (читатели не ждут писателей), synchronous=NORMAL, размер
+кеша страниц, mmap и ожидание блокировки. Вместе с CONN_MAX_AGE
+соединение открывается и настраивается один раз на поток.
+"""
+import sqlite3
+
+from django.conf import settings
+from django.db import connections
+
+
+PRAGMA_ORDER = (
+    'busy_timeout', 'journal_mode', 'synchronous',
+    'cache_size', 'mmap_size', 'temp_store',
+)
+
+
+def pragmas():
+    values = getattr(settings, 'SQLITE_PRAGMAS', {})
+    ordered = [name for name in PRAGMA_ORDER if name in values]
+    ordered += sorted(set(values) - set(ordered))
+    return [(name, values[name]) for name in ordered]
+
+
+def configure(connection):
+    """Выполняет PRAGMA на соединении SQLite; другие базы не трогает."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def copy_database(target, alias='default'):
+    """
+    Копирует базу SQLite alias в файл target через backup API, не
+    останавливая запись. Заменяет репликацию при локальном запуске.
+    """
+    source = connections[alias]
+    source.ensure_connection()
+    destination = sqlite3.connect(target)
+    try:
+        source.connection.backup(destination)
+    finally:
+        destination.close()
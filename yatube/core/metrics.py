@@ -0,0 +1,288 @@
+"""
+Замеры одного запроса и их сводка по представлениям.
+
+RequestMetrics копит время SQL, шаблонов и попадания в кеш текущего
+запроса, Registry складывает итоги в гистограммы по имени
+представления. Сводка живёт в памяти процесса: у каждого воркера своя.
+
+Шаблоны замеряет бэкенд MeteredTemplates, кеш — обёртка MeteredCache
+вокруг бэкенда из настроек; классы Django при этом не подменяются.
+"""
+import contextvars
+import threading
+import time
+from collections import defaultdict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.utils.module_loading import import_string
+
+
+DURATION_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+_MISSING = object()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Шаблон, отрисованный внутри другого, не считаем дважды.
+        self.template_depth = 0
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.sql_time += time.perf_counter() - started
+
+    def server_timing(self, total):
+        return ', '.join((
+            f'total;dur={total * 1000:.1f}',
+            f'sql;dur={self.sql_time * 1000:.1f};'
+            f'desc="{self.sql_count} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'cache;desc="hit={self.cache_hits} miss={self.cache_misses}"',
+        ))
+
+
+def start():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+class Histogram:
+    def __init__(self, buckets=DURATION_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            index = len(self.buckets)
+        self.counts[index] += 1
+        self.total += value
+
+    def as_dict(self):
+        cumulative, buckets = 0, {}
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {'buckets': buckets, 'sum': round(self.total, 3)}
+
+
+class ViewStats:
+    def __init__(self):
+        self.requests = 0
+        self.duration = Histogram()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add(self, metrics, total):
+        self.requests += 1
+        self.duration.observe(total * 1000)
+        self.sql_count += metrics.sql_count
+        self.sql_time += metrics.sql_time
+        self.template_time += metrics.template_time
+        self.cache_hits += metrics.cache_hits
+        self.cache_misses += metrics.cache_misses
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'duration_ms': self.duration.as_dict(),
+            'sql_queries': self.sql_count,
+            'sql_ms': round(self.sql_time * 1000, 3),
+            'template_ms': round(self.template_time * 1000, 3),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = defaultdict(ViewStats)
+
+    def record(self, view_name, metrics, total):
+        with self._lock:
+            self._views[view_name].add(metrics, total)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: stats.as_dict()
+                for name, stats in sorted(self._views.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+registry = Registry()
+
+
+class MeteredTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = current()
+        if metrics is None or metrics.template_depth:
+            return super().render(context, request)
+        metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_depth -= 1
+            metrics.template_time += time.perf_counter() - started
+
+
+class MeteredTemplates(DjangoTemplates):
+    """Шаблонный бэкенд Django, который копит время отрисовки запроса."""
+
+    def from_string(self, template_code):
+        return MeteredTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return MeteredTemplate(
+                self.engine.get_template(template_name), self
+            )
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class MeteredCache(BaseCache):
+    """
+    Обёртка кеша, которая считает попадания и промахи запроса.
+    Настоящий бэкенд описывается словарём OPTIONS['CACHE'] в формате
+    CACHES, ему передаются все вызовы.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        wrapped = dict(params['OPTIONS']['CACHE'])
+        backend = import_string(wrapped.pop('BACKEND'))
+        self._cache = backend(wrapped.pop('LOCATION', ''), wrapped)
+
+    def _count(self, hits, misses):
+        metrics = current()
+        if metrics is not None:
+            metrics.cache_hits += hits
+            metrics.cache_misses += misses
+
+    def get(self, key, default=None, version=None):
+        value = self._cache.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._count(0, 1)
+            return default
+        self._count(1, 0)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = self._cache.get_many(keys, version=version)
+        self._count(len(values), len(keys) - len(values))
+        return values
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._cache.add(key, value, timeout, version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._cache.set(key, value, timeout, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._cache.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        return self._cache.delete(key, version)
+
+    def has_key(self, key, version=None):
+        return self._cache.has_key(key, version)
+
+    def incr(self, key, delta=1, version=None):
+        return self._cache.incr(key, delta, version)
+
+    def decr(self, key, delta=1, version=None):
+        return self._cache.decr(key, delta, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._cache.set_many(data, timeout, version)
+
+    def delete_many(self, keys, version=None):
+        return self._cache.delete_many(keys, version)
+
+    def incr_version(self, key, delta=1, version=None):
+        return self._cache.incr_version(key, delta, version)
+
+    def clear(self):
+        return self._cache.clear()
+
+    def close(self, **kwargs):
+        return self._cache.close(**kwargs)
+
+
+PROMETHEUS_FAMILIES = (
+    ('yatube_sql_queries_total', 'sql_queries', 'SQL-запросы'),
+    ('yatube_sql_ms_total', 'sql_ms', 'время SQL, мс'),
+    ('yatube_template_ms_total', 'template_ms', 'время шаблонов, мс'),
+    ('yatube_cache_hits_total', 'cache_hits', 'попадания в кеш'),
+    ('yatube_cache_misses_total', 'cache_misses', 'промахи кеша'),
+)
+
+
+def prometheus(snapshot):
+    """
+    Сводка в текстовом формате Prometheus: каждое семейство один раз
+    со своими HELP и TYPE и сразу всеми сэмплами по представлениям.
+    """
+    family = 'yatube_request_duration_ms'
+    lines = [
+        f'# HELP {family} время ответа, мс',
+        f'# TYPE {family} histogram',
+    ]
+    for view, stats in snapshot.items():
+        label = f'view="{view}"'
+        duration = stats['duration_ms']
+        for bound, count in duration['buckets'].items():
+            lines.append(f'{family}_bucket{{{label},le="{bound}"}} {count}')
+        lines += [
+            f'{family}_sum{{{label}}} {duration["sum"]}',
+            f'{family}_count{{{label}}} {stats["requests"]}',
+        ]
+    for family, field, description in PROMETHEUS_FAMILIES:
+        lines += [
+            f'# HELP {family} {description}',
+            f'# TYPE {family} counter',
+        ]
+        lines += [
+            f'{family}{{view="{view}"}} {stats[field]}'
+            for view, stats in snapshot.items()
+        ]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,71 @@
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics, routers
+
+
+class PerformanceMiddleware:
+    """
+    Замеряет время запроса, SQL, шаблонов и работу кеша, отдаёт итог
+    в заголовке Server-Timing и копит сводку для /metrics/.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_metrics, token = metrics.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(
+                        request_metrics.execute_wrapper
+                    ))
+                response = self.get_response(request)
+        finally:
+            metrics.finish(token)
+
+        total = request_metrics.elapsed()
+        response['Server-Timing'] = request_metrics.server_timing(total)
+        match = request.resolver_match
+        metrics.registry.record(
+            match.view_name if match else 'unresolved',
+            request_metrics,
+            total
+        )
+        return response
+
+
+class ReplicaMiddleware:
+    """
+    Отправляет чтение лент на реплики и закрепляет пользователя
+    за основной базой после записи.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state, token = routers.start(
+            pinned=routers.PIN_COOKIE in request.COOKIES
+        )
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.finish(token)
+        if state.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                routers.PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = routers.current()
+        state.use_replica = (
+            request.method in ('GET', 'HEAD')
+            and not state.pinned
+            and request.resolver_match.view_name in settings.REPLICA_VIEWS
+        )
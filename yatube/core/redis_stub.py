@@ -0,0 +1,156 @@
+"""
+Сервер-заглушка, понимающий подмножество команд Redis.
+
+Запускается в отдельном потоке текущего процесса и слушает обычный
+TCP-порт, поэтому к нему можно подключаться из нескольких процессов
+и проверять согласованность общего кеша без настоящего Redis.
+"""
+import socketserver
+import threading
+import time
+
+from .resp import RespError, encode_reply, read_reply
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                command = read_reply(self.rfile)
+            except (ConnectionError, OSError):
+                return
+            if not command:
+                return
+            name, args = command[0].upper().decode(), command[1:]
+            method = getattr(self.server, 'cmd_' + name.lower(), None)
+            if method is None:
+                reply = RespError(f'ERR unknown command {name}')
+            else:
+                try:
+                    with self.server.lock:
+                        reply = method(*args)
+                except (TypeError, ValueError):
+                    reply = RespError(f'ERR wrong arguments for {name}')
+            self.wfile.write(encode_reply(reply))
+
+
+class RedisStubServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), _Handler)
+        self.lock = threading.Lock()
+        self.data = {}
+        self.expires = {}
+        self._thread = None
+
+    @property
+    def location(self):
+        host, port = self.server_address
+        return f'redis://{host}:{port}/0'
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.serve_forever, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _alive(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def cmd_ping(self, *args):
+        return True
+
+    def cmd_select(self, db):
+        return True
+
+    def cmd_get(self, key):
+        return self.data[key] if self._alive(key) else None
+
+    def cmd_mget(self, *keys):
+        return [self.cmd_get(key) for key in keys]
+
+    def cmd_set(self, key, value, *options):
+        options = [option.upper() for option in options]
+        if b'NX' in options and self._alive(key):
+            return None
+        self.data[key] = value
+        self.expires.pop(key, None)
+        if b'PX' in options:
+            milliseconds = int(options[options.index(b'PX') + 1])
+            self.expires[key] = time.monotonic() + milliseconds / 1000
+        return True
+
+    def cmd_del(self, *keys):
+        deleted = 0
+        for key in keys:
+            if self._alive(key):
+                del self.data[key]
+                self.expires.pop(key, None)
+                deleted += 1
+        return deleted
+
+    def cmd_exists(self, *keys):
+        return sum(self._alive(key) for key in keys)
+
+    def cmd_incrby(self, key, delta):
+        value = int(self.data[key]) if self._alive(key) else 0
+        value += int(delta)
+        self.data[key] = str(value).encode()
+        return value
+
+    def cmd_pexpire(self, key, milliseconds):
+        if not self._alive(key):
+            return 0
+        self.expires[key] = time.monotonic() + int(milliseconds) / 1000
+        return 1
+
+    def cmd_persist(self, key):
+        if not self._alive(key):
+            return 0
+        return int(self.expires.pop(key, None) is not None)
+
+    def cmd_eval(self, script, numkeys, *args):
+        # Lua заглушка не исполняет и знает только скрипты core.cache.
+        from .cache import INCR_SCRIPT
+
+        if script.decode() != INCR_SCRIPT or int(numkeys) != 1:
+            return RespError('NOSCRIPT unknown script')
+        key, delta = args
+        if not self._alive(key):
+            return None
+        return self.cmd_incrby(key, delta)
+
+    def cmd_flushdb(self, *args):
+        self.data.clear()
+        self.expires.clear()
+        return True
+
+
+_shared_server = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_server():
+    """Общая для процесса заглушка, которую использует LOCATION fake://."""
+    global _shared_server
+    with _shared_lock:
+        if _shared_server is None:
+            _shared_server = RedisStubServer().start()
+    return _shared_server
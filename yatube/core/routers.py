@@ -0,0 +1,88 @@
+"""
+Чтение лент с реплик.
+
+ReplicaMiddleware разрешает запросу читать с реплики, только если это
+GET к представлению из REPLICA_VIEWS, а пользователь недавно ничего не
+записывал. Любая запись в ходе запроса переводит его остаток на
+основную базу и закрепляет чтение пользователя за ней на
+REPLICA_PIN_SECONDS через cookie, чтобы он сразу видел свой пост,
+комментарий или подписку.
+
+Запрос читает с одной реплики, выбранной при первом чтении. Сессии и
+пользователи всегда читаются с основной базы: вход, выход и смена
+пароля не должны ждать, пока реплику обновят.
+
+Ответ, собранный по данным реплики, мог отстать от поколения лент,
+которое запись уже увеличила: used_replica() сообщает о таком ответе,
+и posts.caching с posts.conditional его не кешируют и не валидируют.
+"""
+import contextvars
+import random
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+PIN_COOKIE = 'replica_pin'
+
+PRIMARY_APPS = {'auth', 'sessions'}
+
+_current = contextvars.ContextVar('replica_state', default=None)
+
+
+class ReplicaState:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.use_replica = False
+        self.wrote = False
+        self.replica = None
+
+    def choose_replica(self, replicas):
+        if self.replica not in replicas:
+            self.replica = random.choice(replicas)
+        return self.replica
+
+
+def start(pinned=False):
+    state = ReplicaState(pinned)
+    return state, _current.set(state)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def used_replica():
+    """Читал ли текущий запрос с реплики: такой ответ мог отстать."""
+    state = current()
+    return state is not None and state.replica is not None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = current()
+        replicas = settings.DATABASE_REPLICAS
+        if (
+            state is None
+            or not state.use_replica
+            or state.wrote
+            or not replicas
+            or model._meta.app_label in PRIMARY_APPS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return state.choose_replica(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = current()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы: связи между ними допустимы.
+        return True
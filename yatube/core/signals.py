@@ -0,0 +1,27 @@
+from django.core.signals import setting_changed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.functional import empty
+
+from .database import configure
+from .storage import clear_volume
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    configure(connection)
+
+
+@receiver(setting_changed)
+def thumbnail_storage_changed(setting, enter, **kwargs):
+    """
+    sorl-thumbnail создаёт хранилище один раз; при подмене настроек
+    в тестах его нужно пересоздать, а файлы из памяти — выбросить.
+    """
+    if setting not in ('DEFAULT_FILE_STORAGE', 'THUMBNAIL_STORAGE'):
+        return
+    from sorl.thumbnail import default
+
+    default.storage._wrapped = empty
+    if not enter:
+        clear_volume()
@@ -0,0 +1,151 @@
+"""
+Хранилище файлов в памяти процесса.
+
+Нужно тестам и замерам: загрузки картинок и миниатюры не трогают диск
+и не оставляют за собой каталогов. Экземпляры с одинаковым volume делят
+содержимое, поэтому default_storage и хранилище sorl-thumbnail видят
+одни и те же файлы. При заданном max_size (по умолчанию
+MEMORY_STORAGE_MAX_SIZE) давно не читанные файлы вытесняются.
+"""
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import Storage
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+from django.utils.encoding import filepath_to_uri
+
+
+_volumes = {}
+
+_volumes_lock = threading.Lock()
+
+
+class _Volume:
+    def __init__(self):
+        # Порядок — от давно не читанных к свежим.
+        self.files = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            blob = self.files[key]
+            self.files.move_to_end(key)
+            return blob
+
+    def put(self, key, blob, max_size=None):
+        with self.lock:
+            self._pop(key)
+            self.files[key] = blob
+            self.size += len(blob.content)
+            while max_size is not None and self.size > max_size:
+                oldest = next(iter(self.files))
+                if oldest == key:
+                    break
+                self._pop(oldest)
+
+    def pop(self, key):
+        with self.lock:
+            self._pop(key)
+
+    def _pop(self, key):
+        blob = self.files.pop(key, None)
+        if blob is not None:
+            self.size -= len(blob.content)
+
+
+def _get_volume(name):
+    with _volumes_lock:
+        return _volumes.setdefault(name, _Volume())
+
+
+def clear_volume(name='default'):
+    with _volumes_lock:
+        _volumes.pop(name, None)
+
+
+class _Blob:
+    def __init__(self, content):
+        self.content = content
+        self.modified = timezone.now()
+
+
+@deconstructible
+class MemoryStorage(Storage):
+    def __init__(self, volume='default', base_url=None, max_size=None):
+        self.volume_name = volume
+        self.base_url = base_url
+        self.max_size = max_size
+
+    @property
+    def _max_size(self):
+        if self.max_size is not None:
+            return self.max_size
+        return getattr(settings, 'MEMORY_STORAGE_MAX_SIZE', None)
+
+    @property
+    def _volume(self):
+        return _get_volume(self.volume_name)
+
+    def _blob(self, name):
+        try:
+            return self._volume.get(self._key(name))
+        except KeyError:
+            raise FileNotFoundError(name)
+
+    @staticmethod
+    def _key(name):
+        return name.replace('\\', '/').lstrip('/')
+
+    def _open(self, name, mode='rb'):
+        if 'w' in mode or 'a' in mode:
+            raise ValueError('MemoryStorage открывает файлы только на чтение')
+        file = File(BytesIO(self._blob(name).content), name=name)
+        file.mode = mode
+        return file
+
+    def _save(self, name, content):
+        chunks = [
+            chunk.encode() if isinstance(chunk, str) else chunk
+            for chunk in content.chunks()
+        ]
+        data = b''.join(chunks)
+        self._volume.put(self._key(name), _Blob(data), self._max_size)
+        return name
+
+    def delete(self, name):
+        self._volume.pop(self._key(name))
+
+    def exists(self, name):
+        return self._key(name) in self._volume.files
+
+    def listdir(self, path):
+        prefix = self._key(path).rstrip('/')
+        prefix = prefix + '/' if prefix else ''
+        directories, files = set(), set()
+        for key in list(self._volume.files):
+            if not key.startswith(prefix):
+                continue
+            head, _, tail = key[len(prefix):].partition('/')
+            if tail:
+                directories.add(head)
+            else:
+                files.add(head)
+        return sorted(directories), sorted(files)
+
+    def size(self, name):
+        return len(self._blob(name).content)
+
+    def url(self, name):
+        base_url = self.base_url or settings.MEDIA_URL
+        return urljoin(base_url, filepath_to_uri(self._key(name)))
+
+    def get_modified_time(self, name):
+        return self._blob(name).modified
+
+    get_created_time = get_accessed_time = get_modified_time
@@ -0,0 +1,126 @@
+import subprocess
+import sys
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from .. import cache as redis_cache
+from ..cache import RedisCache
+from ..redis_stub import RedisStubServer
+
+
+WORKER_SCRIPT = '''
+import sys
+from core.cache import RedisCache
+cache = RedisCache(sys.argv[1], {'KEY_PREFIX': 'yatube'})
+cache.incr('generation')
+cache.set('from_worker', {'pid': 'worker'})
+'''
+
+
+class RedisCacheTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = RedisStubServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super().tearDownClass()
+
+    def make_cache(self, **params):
+        params.setdefault('KEY_PREFIX', 'yatube')
+        return RedisCache(RedisCacheTests.server.location, params)
+
+    def setUp(self):
+        self.cache = self.make_cache()
+        self.cache.clear()
+
+    def test_basic_operations(self):
+        """Базовые операции кеша работают через протокол Redis."""
+        self.cache.set('post', {'id': 1, 'text': 'Тестовый пост'})
+        self.assertEqual(
+            self.cache.get('post'), {'id': 1, 'text': 'Тестовый пост'}
+        )
+        self.assertFalse(self.cache.add('post', 'другое значение'))
+        self.assertTrue(self.cache.add('group', 'Тестовая группа'))
+        self.assertTrue(self.cache.has_key('group'))
+        self.cache.delete('group')
+        self.assertIsNone(self.cache.get('group'))
+        self.assertEqual(self.cache.get('missing', 'default'), 'default')
+
+    def test_incr(self):
+        """incr увеличивает только существующие ключи."""
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter'), 2)
+        self.assertEqual(self.cache.get('counter'), 2)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.assertFalse(self.cache.has_key('missing'))
+
+    def test_many(self):
+        """get_many и set_many обходятся одним обращением к серверу."""
+        self.cache.set_many({'a': 1, 'b': [2], 'c': 'три'})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c', 'd']),
+            {'a': 1, 'b': [2], 'c': 'три'}
+        )
+
+    def test_timeout(self):
+        """Ключи истекают по таймауту, timeout=None хранит бессрочно."""
+        self.cache.set('short', 'value', 0.05)
+        self.cache.set('forever', 'value', None)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertEqual(self.cache.get('forever'), 'value')
+
+    def test_touch_without_timeout_persists(self):
+        """touch с timeout=None снимает срок жизни ключа."""
+        self.cache.set('key', 'value', 0.05)
+        self.assertTrue(self.cache.touch('key', None))
+        self.assertFalse(self.cache.touch('missing', None))
+        time.sleep(0.1)
+        self.assertEqual(self.cache.get('key'), 'value')
+
+    def test_max_connections_limits_concurrent_use(self):
+        """Одновременно открыто не больше MAX_CONNECTIONS соединений."""
+        cache = self.make_cache(OPTIONS={'MAX_CONNECTIONS': 2})
+        cache.set('key', 'value')
+        with mock.patch.object(
+            redis_cache, '_Connection', wraps=redis_cache._Connection
+        ) as connection:
+            threads = [
+                threading.Thread(
+                    target=lambda: [cache.get('key') for _ in range(50)]
+                )
+                for _ in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        # Одно соединение из двух уже открыл set.
+        self.assertLessEqual(connection.call_count, 1)
+
+    def test_versioning(self):
+        """Разные версии ключей не пересекаются."""
+        self.cache.set('key', 'old', version=1)
+        self.cache.set('key', 'new', version=2)
+        self.assertEqual(self.cache.get('key', version=1), 'old')
+        self.assertEqual(self.make_cache(VERSION=2).get('key'), 'new')
+
+    def test_coherency_across_workers(self):
+        """Запись одного процесса сразу видна другим."""
+        other_worker = self.make_cache()
+        self.cache.set('generation', 1)
+        subprocess.run(
+            [sys.executable, '-c', WORKER_SCRIPT, self.server.location],
+            cwd=settings.BASE_DIR,
+            check=True
+        )
+        self.assertEqual(other_worker.get('generation'), 2)
+        self.assertEqual(other_worker.get('from_worker'), {'pid': 'worker'})
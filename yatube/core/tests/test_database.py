@@ -0,0 +1,42 @@
+import os
+import tempfile
+
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase, override_settings
+
+
+class SQLitePragmaTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'test.sqlite3')
+
+    def pragma(self, name):
+        wrapper = DatabaseWrapper(
+            {**connection.settings_dict, 'NAME': self.path}, alias='pragmas'
+        )
+        try:
+            with wrapper.cursor() as cursor:
+                cursor.execute(f'PRAGMA {name}')
+                return cursor.fetchone()[0]
+        finally:
+            wrapper.close()
+
+    def test_pragmas_applied_on_connect(self):
+        """Новое соединение сразу получает WAL и остальные PRAGMA."""
+        expected = {
+            'journal_mode': 'wal',
+            'synchronous': 1,
+            'busy_timeout': 20000,
+            'cache_size': -64000,
+            'temp_store': 2,
+        }
+        for name, value in expected.items():
+            with self.subTest(pragma=name):
+                self.assertEqual(self.pragma(name), value)
+
+    @override_settings(SQLITE_PRAGMAS={'journal_mode': 'delete'})
+    def test_pragmas_from_settings(self):
+        """PRAGMA берутся из SQLITE_PRAGMAS."""
+        self.assertEqual(self.pragma('journal_mode'), 'delete')
@@ -0,0 +1,110 @@
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.template.base import Template
+from django.test import TestCase, override_settings
+
+from core import metrics
+from posts.models import Post, User
+
+
+METRICS_TOKEN = 'metrics-token'
+
+
+@override_settings(METRICS_TOKEN=METRICS_TOKEN)
+class PerformanceMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.reset()
+
+    def get_metrics(self, data=None, token=METRICS_TOKEN):
+        return self.client.get(
+            '/metrics/', data, HTTP_AUTHORIZATION=f'Bearer {token}'
+        )
+
+    def test_server_timing_header(self):
+        """Ответ несёт Server-Timing с SQL, шаблонами и кешем."""
+        response = self.client.get('/')
+        timing = response['Server-Timing']
+        for part in ('total;dur=', 'sql;dur=', 'tpl;dur=', 'cache;desc='):
+            with self.subTest(part=part):
+                self.assertIn(part, timing)
+        self.assertNotIn('desc="0 queries"', timing)
+
+    def test_cache_hits_and_misses(self):
+        """Повторный запрос закешированной страницы считается попаданием."""
+        self.client.get('/')
+        response = self.client.get('/')
+        self.assertIn('desc="0 queries"', response['Server-Timing'])
+        stats = metrics.registry.snapshot()['posts:index']
+        self.assertEqual(stats['requests'], 2)
+        self.assertGreater(stats['cache_hits'], 0)
+        self.assertGreater(stats['cache_misses'], 0)
+
+    def test_metrics_endpoint(self):
+        """Сводка по представлениям доступна в JSON и для Prometheus."""
+        self.client.get('/')
+        snapshot = self.get_metrics().json()
+        self.assertEqual(
+            snapshot['posts:index']['duration_ms']['buckets']['+Inf'], 1
+        )
+        text = self.get_metrics({'format': 'prometheus'}).content.decode()
+        self.assertIn(
+            'yatube_request_duration_ms_count{view="posts:index"} 1', text
+        )
+
+    def test_prometheus_families_grouped(self):
+        """Каждое семейство описано один раз, время SQL и шаблонов тоже."""
+        self.client.get('/')
+        self.client.get('/about/author/')
+        lines = self.get_metrics(
+            {'format': 'prometheus'}
+        ).content.decode().splitlines()
+        families, family = [], None
+        for line in lines:
+            if line.startswith('# HELP '):
+                family = line.split()[2]
+                families.append(family)
+            elif not line.startswith('#'):
+                with self.subTest(line=line):
+                    self.assertTrue(line.startswith(family))
+        self.assertEqual(len(families), len(set(families)))
+        for family in ('yatube_sql_ms_total', 'yatube_template_ms_total'):
+            with self.subTest(family=family):
+                self.assertTrue(any(
+                    line.startswith(f'{family}{{view="posts:index"}}')
+                    for line in lines
+                ))
+
+    def test_classes_not_patched(self):
+        """Замеры идут через свои бэкенды, классы Django не подменены."""
+        self.assertEqual(Template.render.__module__, 'django.template.base')
+        self.assertEqual(
+            LocMemCache.get.__module__, 'django.core.cache.backends.locmem'
+        )
+
+    def test_metrics_endpoint_closed_for_outsiders(self):
+        """
+        Без токена и прав персонала сводку не видно даже с локального
+        адреса, за которым может стоять прокси.
+        """
+        for name, response in (
+            ('без токена', self.client.get('/metrics/')),
+            ('чужой токен', self.get_metrics(token='wrong')),
+        ):
+            with self.subTest(name):
+                self.assertEqual(response.status_code, 404)
+        with override_settings(METRICS_TOKEN=''):
+            response = self.get_metrics(token='')
+        self.assertEqual(response.status_code, 404)
+
+    def test_metrics_endpoint_open_for_staff(self):
+        """Персонал видит сводку без токена."""
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get('/metrics/').status_code, 200)
@@ -0,0 +1,121 @@
+import os
+import sqlite3
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+)
+from django.urls import resolve
+
+from posts.models import Post
+
+from ..database import copy_database
+from ..middleware import ReplicaMiddleware
+from ..routers import PIN_COOKIE, ReplicaRouter
+
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTests(SimpleTestCase):
+    def request(self, path, method='get', write=False, cookies=None):
+        """
+        Прогоняет запрос через ReplicaMiddleware и возвращает базу,
+        которую роутер выбрал для чтения внутри представления.
+        """
+        request = getattr(RequestFactory(), method)(path)
+        request.COOKIES.update(cookies or {})
+        request.resolver_match = resolve(path)
+        router = ReplicaRouter()
+        used = {}
+
+        def view(request):
+            middleware.process_view(request, None, (), {})
+            used['read'] = router.db_for_read(Post)
+            used['reads'] = {router.db_for_read(Post) for _ in range(20)}
+            used['auth'] = {
+                router.db_for_read(model) for model in (User, Session)
+            }
+            if write:
+                router.db_for_write(Post)
+                used['after_write'] = router.db_for_read(Post)
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(view)
+        response = middleware(request)
+        return used, response
+
+    def test_feeds_read_from_replica(self):
+        """Ленты читаются с реплики, остальные страницы — с основной."""
+        for path, expected in (
+            ('/', 'replica1'),
+            ('/group/slug/', 'replica1'),
+            ('/profile/user/', 'replica1'),
+            ('/posts/1/', 'replica1'),
+            ('/follow/', 'replica1'),
+            ('/create/', 'default'),
+            ('/search/', 'default'),
+        ):
+            with self.subTest(path=path):
+                used, _ = self.request(path)
+                self.assertEqual(used['read'], expected)
+        used, _ = self.request('/', method='post')
+        self.assertEqual(used['read'], 'default')
+
+    @override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+    def test_one_replica_per_request(self):
+        """Все чтения запроса идут на одну реплику."""
+        used, _ = self.request('/')
+        self.assertEqual(used['reads'], {used['read']})
+
+    def test_auth_reads_primary(self):
+        """Сессии и пользователи читаются с основной базы."""
+        used, _ = self.request('/')
+        self.assertEqual(used['read'], 'replica1')
+        self.assertEqual(used['auth'], {'default'})
+
+    def test_write_pins_user_to_primary(self):
+        """После записи чтение идёт в основную базу и ставится cookie."""
+        used, response = self.request('/', write=True)
+        self.assertEqual(used['after_write'], 'default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        used, response = self.request('/', cookies={PIN_COOKIE: '1'})
+        self.assertEqual(used['read'], 'default')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_outside_request_reads_primary(self):
+        """Без запроса (команды, фоновые потоки) чтение идёт в основную."""
+        self.assertEqual(ReplicaRouter().db_for_read(Post), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        """Без реплик всё читается из основной базы, cookie не ставится."""
+        used, response = self.request('/', write=True)
+        self.assertEqual(used['read'], 'default')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+class CopyDatabaseTests(TransactionTestCase):
+    def test_replica_sees_data_after_copy(self):
+        """Копия базы видит данные, записанные до копирования."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        replica = os.path.join(directory.name, 'replica.sqlite3')
+
+        def usernames():
+            with sqlite3.connect(replica) as connection:
+                return {row[0] for row in connection.execute(
+                    'SELECT username FROM auth_user'
+                )}
+
+        User.objects.create_user(username='first')
+        copy_database(replica)
+        User.objects.create_user(username='second')
+        self.assertEqual(usernames(), {'first'})
+        copy_database(replica)
+        self.assertEqual(usernames(), {'first', 'second'})
@@ -0,0 +1,70 @@
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, override_settings
+
+from ..storage import MemoryStorage, clear_volume
+from ..views import media
+
+
+class MemoryStorageTests(SimpleTestCase):
+    def setUp(self):
+        self.storage = MemoryStorage(volume='tests')
+
+    def tearDown(self):
+        clear_volume('tests')
+
+    def test_save_and_open(self):
+        """Сохранённый файл читается, виден в listdir и удаляется."""
+        name = self.storage.save('posts/a.txt', ContentFile(b'data'))
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.storage.size(name), 4)
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), b'data')
+        self.assertEqual(self.storage.listdir(''), (['posts'], []))
+        self.assertEqual(self.storage.listdir('posts'), ([], ['a.txt']))
+        self.assertEqual(self.storage.url(name), '/media/posts/a.txt')
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+        with self.assertRaises(FileNotFoundError):
+            self.storage.open(name)
+
+    def test_volume_is_shared(self):
+        """Экземпляры с одним volume видят одни файлы."""
+        self.storage.save('a.txt', ContentFile(b'data'))
+        self.assertTrue(MemoryStorage(volume='tests').exists('a.txt'))
+        self.assertFalse(MemoryStorage(volume='other').exists('a.txt'))
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняются давно не читанные файлы."""
+        storage = MemoryStorage(volume='tests', max_size=10)
+        storage.save('a', ContentFile(b'1234'))
+        storage.save('b', ContentFile(b'1234'))
+        storage.open('a').close()
+        storage.save('c', ContentFile(b'1234'))
+        self.assertTrue(storage.exists('a'))
+        self.assertFalse(storage.exists('b'))
+        self.assertTrue(storage.exists('c'))
+
+    def test_file_larger_than_cap_is_kept(self):
+        """Файл больше лимита остаётся: вытесняются только остальные."""
+        storage = MemoryStorage(volume='tests', max_size=4)
+        storage.save('a', ContentFile(b'12'))
+        storage.save('b', ContentFile(b'123456'))
+        self.assertFalse(storage.exists('a'))
+        self.assertTrue(storage.exists('b'))
+
+    @override_settings(MEMORY_STORAGE_MAX_SIZE=4)
+    def test_max_size_from_settings(self):
+        """Лимит без явного max_size берётся из настроек."""
+        self.storage.save('a', ContentFile(b'1234'))
+        self.storage.save('b', ContentFile(b'1234'))
+        self.assertFalse(self.storage.exists('a'))
+
+    @override_settings(DEFAULT_FILE_STORAGE='core.storage.MemoryStorage')
+    def test_selected_by_settings(self):
+        """default_storage берётся из настроек и отдаётся через media."""
+        default_storage.save('posts/b.gif', ContentFile(b'GIF89a'))
+        self.assertIsInstance(default_storage._wrapped, MemoryStorage)
+        response = media(None, 'posts/b.gif')
+        self.assertEqual(response['Content-Type'], 'image/gif')
+        self.assertEqual(b''.join(response.streaming_content), b'GIF89a')
@@ -0,0 +1,46 @@
+"""
+Хранилище метаданных sorl-thumbnail: база данных с кешем перед ней.
+
+Источник правды — таблица sorl, поэтому записи переживают перезапуск,
+вытеснение из кеша и видны всем воркерам. Кеш только ускоряет чтение:
+промахи добираются из базы одним запросом на пачку и кладутся обратно.
+Отсутствие записи не кешируется — миниатюра, которую создал другой
+процесс, появится на страницах сразу.
+"""
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.images import deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+
+class CachedDBKVStore(KVStore):
+    def get_many(self, image_files):
+        """Пакетный get: один запрос к кешу и не больше одного к базе."""
+        keys = [add_prefix(image_file.key) for image_file in image_files]
+        values = self.cache.get_many(keys)
+        missing = [key for key in keys if not values.get(key)]
+        if missing:
+            found = dict(
+                KVStoreModel.objects.filter(
+                    key__in=missing
+                ).values_list('key', 'value')
+            )
+            if found:
+                self.cache.set_many(found, settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(found)
+        return [
+            deserialize_image_file(values[key]) if values.get(key) else None
+            for key in keys
+        ]
+
+    def _get_raw(self, key):
+        value = self.cache.get(key)
+        if value:
+            return value
+        try:
+            value = KVStoreModel.objects.get(key=key).value
+        except KVStoreModel.DoesNotExist:
+            return None
+        self.cache.set(key, value, settings.THUMBNAIL_CACHE_TIMEOUT)
+        return value
@@ -1,4 +1,13 @@
+import mimetypes
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from . import metrics as performance
 
 
 def page_not_found(request, exception):
@@ -15,3 +24,34 @@ def csrf_failure(request, reason=''):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+def _has_metrics_token(request):
+    token = settings.METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and constant_time_compare(header, f'Bearer {token}')
+
+
+def metrics(request):
+    """Сводка замеров процесса: JSON или ?format=prometheus."""
+    if not (request.user.is_staff or _has_metrics_token(request)):
+        raise PermissionDenied
+    snapshot = performance.registry.snapshot()
+    if request.GET.get('format') == 'prometheus':
+        return HttpResponse(
+            performance.prometheus(snapshot),
+            content_type='text/plain; version=0.0.4'
+        )
+    return JsonResponse(snapshot)
+
+
+def media(request, path):
+    """Отдаёт загрузки из default_storage, когда их нет на диске (DEBUG)."""
+    try:
+        file = default_storage.open(path)
+    except FileNotFoundError:
+        raise Http404(path)
+    content_type, _ = mimetypes.guess_type(path)
+    return FileResponse(
+        file, content_type=content_type or 'application/octet-stream'
+    )
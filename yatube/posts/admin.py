@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Post, Group, Comment
+from .search import search_ids
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -16,6 +17,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск идёт по полнотекстовому индексу, а не через LIKE."""
+        if not search_term:
+            return queryset, False
+        return queryset.filter(pk__in=search_ids(search_term)), False
+
 
 class CommentAdmin(admin.ModelAdmin):
     list_display = (
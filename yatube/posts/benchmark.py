@@ -0,0 +1,463 @@
+"""
+Нагрузочный замер всех адресов приложения posts.
+
+seed() наполняет базу данными нужного масштаба, run() прогоняет каждый
+адрес из posts/urls.py через тестовый клиент Django или через настоящий
+WSGI-сервер и считает перцентили времени ответа, число SQL-запросов
+и пропускную способность. Результат — словарь, который команда
+benchmark_urls сохраняет в JSON для сравнения между коммитами.
+"""
+import io
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import Cookie, CookieJar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.middleware.csrf import get_token
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from . import media, search, stats, timeline
+from .caching import bump_feed_generation
+from .models import Comment, Follow, Group, Post, User
+from .thumbnails import prepare_images, reuse_variants
+from .urls import urlpatterns
+
+
+SCALE = {
+    'users': 100,
+    'groups': 10,
+    'posts': 2000,
+    'follows': 1000,
+    'comments': 5000,
+    'images': 50,
+}
+
+PERCENTILES = (50, 90, 99)
+
+WORDS = (
+    'город', 'книга', 'погода', 'музыка', 'кошка', 'дорога', 'утро',
+    'работа', 'лето', 'море', 'фильм', 'друг', 'вечер', 'сад', 'поезд',
+)
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _image(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (1200, 800), color).save(buffer, 'JPEG')
+    return ContentFile(buffer.getvalue(), name='bench.jpg')
+
+
+def seed_images(post_ids, rng, distinct=10):
+    """
+    Картинки постам вместе с миниатюрами и вариантами, без очереди.
+    Картинок всего distinct разных, как при репостах одного снимка.
+    """
+    colors = [
+        tuple(rng.randrange(256) for _ in range(3)) for _ in range(distinct)
+    ]
+    for post_id in post_ids:
+        name = media.store(_image(rng.choice(colors)))
+        Post.objects.filter(pk=post_id).update(image=name)
+        media.retain(name)
+        if not reuse_variants(post_id, name):
+            prepare_images(post_id, name)
+
+
+def seed(scale=None, random_seed=0):
+    """
+    Наполняет базу пользователями, группами, постами с картинками,
+    подписками и комментариями, затем пересобирает ленты, счётчики
+    и индекс. Картинки пишутся в default_storage.
+    """
+    scale = {**SCALE, **(scale or {})}
+    rng = random.Random(random_seed)
+
+    User.objects.bulk_create(
+        (
+            User(username=f'bench_user_{i}', first_name='Пользователь')
+            for i in range(scale['users'])
+        )
+    )
+    User.objects.create_user(
+        username='bench_staff', is_staff=True, is_superuser=True
+    )
+    Group.objects.bulk_create(
+        (
+            Group(
+                title=f'Группа {i}',
+                slug=f'bench-group-{i}',
+                description=_text(rng, 10)
+            )
+            for i in range(scale['groups'])
+        )
+    )
+    user_ids = list(User.objects.values_list('pk', flat=True))
+    group_ids = list(Group.objects.values_list('pk', flat=True)) + [None]
+
+    Post.objects.bulk_create(
+        (
+            Post(
+                author_id=rng.choice(user_ids),
+                group_id=rng.choice(group_ids),
+                text=_text(rng, rng.randint(5, 60))
+            )
+            for _ in range(scale['posts'])
+        )
+    )
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+
+    pairs = {
+        tuple(rng.sample(user_ids, 2)) for _ in range(scale['follows'])
+    }
+    Follow.objects.bulk_create(
+        Follow(user_id=user, author_id=author) for user, author in pairs
+    )
+    if post_ids:
+        Comment.objects.bulk_create(
+            (
+                Comment(
+                    post_id=rng.choice(post_ids),
+                    author_id=rng.choice(user_ids),
+                    text=_text(rng, rng.randint(3, 20))
+                )
+                for _ in range(scale['comments'])
+            )
+        )
+
+    seed_images(post_ids[-scale['images']:] if scale['images'] else [], rng)
+
+    timeline.rebuild()
+    stats.reconcile()
+    search.rebuild()
+    bump_feed_generation()
+    return scale
+
+
+def routes():
+    """
+    Адреса для замера: имя маршрута, метод, путь, данные и нужен ли вход.
+    Маршруты из posts/urls.py, которых здесь нет, попадут в skipped.
+    """
+    staff = User.objects.get(username='bench_staff')
+    post = Post.objects.select_related('author', 'group').filter(
+        group__isnull=False, comments_count__gt=0
+    ).order_by('-comments_count').first() or Post.objects.first()
+    author = post.author
+    group = post.group or Group.objects.first()
+    follower = User.objects.filter(
+        follower__isnull=False
+    ).exclude(pk=author.pk).first() or staff
+    target = User.objects.exclude(pk__in=[follower.pk, author.pk]).first()
+
+    return {
+        'index': ('get', reverse('posts:index'), None, None),
+        'group_list': (
+            'get', reverse('posts:group_list', args=[group.slug]), None, None
+        ),
+        'profile': (
+            'get', reverse('posts:profile', args=[author.username]),
+            None, None
+        ),
+        'post_detail': (
+            'get', reverse('posts:post_detail', args=[post.pk]), None, None
+        ),
+        'post_comments': (
+            'get', reverse('posts:post_comments', args=[post.pk]),
+            None, None
+        ),
+        'search': ('get', reverse('posts:search'), {'q': WORDS[0]}, None),
+        'export_content': ('get', reverse('posts:export_content'), None,
+                           staff),
+        'post_create': ('get', reverse('posts:post_create'), None, author),
+        'post_edit': (
+            'get', reverse('posts:post_edit', args=[post.pk]), None, author
+        ),
+        'add_comment': (
+            'post', reverse('posts:add_comment', args=[post.pk]),
+            {'text': _text(random.Random(0), 8)}, follower
+        ),
+        'follow_index': ('get', reverse('posts:follow_index'), None,
+                         follower),
+        'profile_follow': (
+            'get', reverse('posts:profile_follow', args=[target.username]),
+            None, follower
+        ),
+        'profile_unfollow': (
+            'get', reverse('posts:profile_unfollow', args=[target.username]),
+            None, follower
+        ),
+    }
+
+
+def percentile(values, rank):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    index = max(math.ceil(rank / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def summarize(timings, queries, elapsed, statuses):
+    result = {
+        'requests': len(timings),
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+        'max_ms': round(max(timings) * 1000, 3),
+        'throughput_rps': round(len(timings) / elapsed, 1),
+        'statuses': sorted(set(statuses)),
+    }
+    for rank in PERCENTILES:
+        result[f'p{rank}_ms'] = round(percentile(timings, rank) * 1000, 3)
+    if queries:
+        result['queries_per_request'] = round(sum(queries) / len(queries), 2)
+    return result
+
+
+class _ClientTransport:
+    """Запросы через тестовый клиент; считает SQL-запросы."""
+    counts_queries = True
+
+    def __init__(self):
+        self.clients = {}
+
+    def _client(self, user):
+        key = user.pk if user else None
+        if key not in self.clients:
+            client = Client()
+            if user:
+                client.force_login(user)
+            self.clients[key] = client
+        return self.clients[key]
+
+    def request(self, method, path, data, user):
+        response = getattr(self._client(user), method)(path, data)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response.status_code
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class _WSGITransport:
+    """Запросы по HTTP к WSGI-серверу, поднятому в соседнем потоке."""
+    counts_queries = False
+
+    def __init__(self):
+        self.server = ThreadedWSGIServer(
+            ('127.0.0.1', 0), _QuietHandler, allow_reuse_address=False
+        )
+        self.server.set_app(get_wsgi_application())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        host, port = self.server.server_address
+        self.base_url = f'http://{host}:{port}'
+        self.openers = {}
+        request = RequestFactory().get('/')
+        get_token(request)
+        self.csrf_token = request.META['CSRF_COOKIE']
+
+    def _cookie(self, name, value):
+        return Cookie(
+            0, name, value, None, False, '127.0.0.1', False, False, '/',
+            True, False, None, True, None, None, {}
+        )
+
+    def _opener(self, user):
+        key = user.pk if user else None
+        if key not in self.openers:
+            jar = CookieJar()
+            jar.set_cookie(
+                self._cookie(settings.CSRF_COOKIE_NAME, self.csrf_token)
+            )
+            if user:
+                client = Client()
+                client.force_login(user)
+                session = client.cookies[settings.SESSION_COOKIE_NAME].value
+                jar.set_cookie(
+                    self._cookie(settings.SESSION_COOKIE_NAME, session)
+                )
+            self.openers[key] = urllib.request.build_opener(
+                urllib.request.HTTPCookieProcessor(jar), _NoRedirect
+            )
+        return self.openers[key]
+
+    def request(self, method, path, data, user):
+        url = self.base_url + path
+        body = None
+        if data and method == 'get':
+            url += '?' + urllib.parse.urlencode(data)
+        elif data:
+            body = urllib.parse.urlencode(data).encode()
+        request = urllib.request.Request(
+            url, data=body, headers={'X-CSRFToken': self.csrf_token}
+        )
+        try:
+            with self._opener(user).open(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            return error.code
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+def run(transport='client', requests=50, warmup=5, cold_cache=False,
+        only=None):
+    """
+    Замеряет каждый маршрут: warmup запросов без учёта, затем requests
+    запросов подряд. При cold_cache кеш чистится перед каждым запросом.
+    """
+    targets = routes()
+    skipped = {pattern.name for pattern in urlpatterns} - set(targets)
+    if only:
+        targets = {name: targets[name] for name in only}
+    runner = _ClientTransport() if transport == 'client' else _WSGITransport()
+    results = {}
+    try:
+        for name, (method, path, data, user) in targets.items():
+            for _ in range(warmup):
+                runner.request(method, path, data, user)
+            timings, queries, statuses = [], [], []
+            started = time.perf_counter()
+            for _ in range(requests):
+                if cold_cache:
+                    cache.clear()
+                with CaptureQueriesContext(connection) as context:
+                    begin = time.perf_counter()
+                    statuses.append(runner.request(method, path, data, user))
+                    timings.append(time.perf_counter() - begin)
+                if runner.counts_queries:
+                    queries.append(len(context.captured_queries))
+            elapsed = time.perf_counter() - started
+            results[name] = summarize(timings, queries, elapsed, statuses)
+    finally:
+        if transport != 'client':
+            runner.close()
+    return {
+        'transport': transport,
+        'cold_cache': cold_cache,
+        'routes': results,
+        'skipped': sorted(skipped),
+    }
+
+
+FEED_ROUTES = ('index', 'group_list', 'profile', 'follow_index')
+
+
+def _mixed_worker(requests, deadline, user, timings, statuses, errors):
+    client = Client()
+    client.force_login(user)
+    try:
+        while time.perf_counter() < deadline:
+            for method, path, data in requests():
+                begin = time.perf_counter()
+                try:
+                    response = getattr(client, method)(path, data)
+                except Exception as error:
+                    errors.append(f'{type(error).__name__}: {error}')
+                    continue
+                timings.append(time.perf_counter() - begin)
+                statuses.append(response.status_code)
+    finally:
+        connection.close()
+
+
+def run_mixed(readers=4, writers=2, duration=5.0):
+    """
+    Смешанная нагрузка из потоков: readers читают ленты, writers
+    публикуют посты и комментарии. Показывает, как запись мешает
+    чтению при текущем журнале SQLite.
+    """
+    targets = routes()
+    feeds = [targets[name][1:3] for name in FEED_ROUTES]
+    reader = User.objects.get(username='bench_staff')
+    post = Post.objects.order_by('pk').first()
+    authors = list(User.objects.exclude(pk=reader.pk)[:max(writers, 1)])
+    rng = random.Random(0)
+
+    def read():
+        return [('get', path, data) for path, data in feeds]
+
+    def write():
+        return [
+            ('post', reverse('posts:post_create'), {'text': _text(rng, 20)}),
+            (
+                'post', reverse('posts:add_comment', args=[post.pk]),
+                {'text': _text(rng, 8)}
+            ),
+        ]
+
+    # Чтобы follow_index был непустым, читатель подписан на авторов.
+    Follow.objects.bulk_create(
+        Follow(user=reader, author=author) for author in authors
+        if not Follow.objects.filter(user=reader, author=author).exists()
+    )
+    kinds = {'read': ([], [], []), 'write': ([], [], [])}
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(
+            target=_mixed_worker,
+            args=(read, deadline, reader, *kinds['read'])
+        )
+        for _ in range(readers)
+    ] + [
+        threading.Thread(
+            target=_mixed_worker,
+            args=(write, deadline, authors[i % len(authors)],
+                  *kinds['write'])
+        )
+        for i in range(writers)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    result = {'readers': readers, 'writers': writers, 'duration': duration}
+    for kind, (timings, statuses, errors) in kinds.items():
+        result[kind] = summarize(timings, [], elapsed, statuses) if (
+            timings
+        ) else {'requests': 0}
+        result[kind]['errors'] = len(errors)
+        result[kind]['error_samples'] = sorted(set(errors))[:3]
+    return result
+
+
+def compare(baseline, current, field='p50_ms'):
+    """Изменение field по каждому маршруту относительно базового замера."""
+    changes = {}
+    for name, result in current['routes'].items():
+        before = baseline.get('routes', {}).get(name, {}).get(field)
+        if before:
+            changes[name] = round((result[field] - before) / before * 100, 1)
+    return changes
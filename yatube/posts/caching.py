@@ -0,0 +1,100 @@
+"""
+Кеширование страниц лент по счётчику поколений.
+
+Ключ страницы включает номер поколения, который увеличивается при любом
+изменении постов, групп, пользователей и подписок. Старые страницы
+просто перестают читаться, поэтому TTL можно держать большим. Рядом
+хранится время последней смены поколения для заголовка Last-Modified.
+"""
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import transaction
+
+from core.routers import used_replica
+
+
+FEED_GENERATION_KEY = 'feed_generation'
+
+FEED_CHANGED_KEY = 'feed_changed'
+
+# Последнее поколение, которое видел процесс.
+_last_generation = 0
+
+
+def _remember(generation):
+    global _last_generation
+    if generation is not None and generation > _last_generation:
+        _last_generation = generation
+    return generation
+
+
+def _seed():
+    """
+    Начало счётчика после вытеснения из кеша. Счётчик растёт на единицу
+    за изменение и может обогнать часы, поэтому берётся не меньше
+    последнего виденного поколения, а время — в миллисекундах.
+    """
+    return max(_last_generation + 1, time.time_ns() // 1_000_000)
+
+
+def get_feed_generation():
+    generation = cache.get(FEED_GENERATION_KEY)
+    if generation is None:
+        # Что менялось до сброса кеша, неизвестно: считаем, что сейчас.
+        cache.add(FEED_CHANGED_KEY, time.time(), None)
+        cache.add(FEED_GENERATION_KEY, _seed(), None)
+        generation = cache.get(FEED_GENERATION_KEY)
+    return _remember(generation)
+
+
+def get_feed_changed():
+    """Время последней смены поколения или None, если оно неизвестно."""
+    return cache.get(FEED_CHANGED_KEY)
+
+
+def bump_feed_generation():
+    """
+    Сменяет поколение после фиксации транзакции: иначе параллельный
+    запрос закешировал бы ещё старые данные под новым поколением.
+    """
+    transaction.on_commit(_bump)
+
+
+def _bump():
+    cache.set(FEED_CHANGED_KEY, time.time(), None)
+    try:
+        _remember(cache.incr(FEED_GENERATION_KEY))
+    except ValueError:
+        # Счётчик вытеснен из кеша.
+        cache.add(FEED_GENERATION_KEY, _seed(), None)
+
+
+def cache_feed(timeout, key_prefix):
+    """
+    Замена cache_page для лент: отдельный ключ для каждого пользователя
+    (анонимы делят один) и сброс всех страниц при смене поколения.
+    Страницы, прочитанные с реплики, не кешируются: реплика могла ещё
+    не получить запись, которая сменила поколение.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            user_id = request.user.pk if request.user.is_authenticated else 0
+            key = ':'.join((
+                key_prefix,
+                str(get_feed_generation()),
+                str(user_id),
+                request.get_full_path(),
+            ))
+            response = cache.get(key)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200 and not used_replica():
+                    cache.set(key, response, timeout)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,105 @@
+"""
+Условные GET для лент и страницы поста.
+
+Ленты меняются только вместе с поколением из posts.caching: оно растёт
+при любом изменении постов, групп, пользователей, подписок и при
+готовности миниатюр. Поэтому ETag ленты — поколение и пользователь
+(страницы авторизованных отличаются), а Last-Modified — время смены
+поколения; 304 отдаётся без единого SQL-запроса. Комментарии поколение
+не трогают, и у страницы поста к валидаторам добавляется один запрос
+по первичному ключу: время изменения поста, число комментариев и время
+изменения последнего из них.
+
+Страницы авторизованных содержат формы с CSRF-токеном, а вход
+сменяет токен, не трогая поколение. Поэтому в их ETag входит
+CSRF-cookie, а Last-Modified им не отдаётся: по одной дате браузер
+получил бы 304 и отправил форму со старым токеном.
+
+Валидаторы получают только ответы 200 и 304: иначе браузер сохранил бы
+ETag страницы 404 и при повторе получал бы 304 вместо неё. Если
+state_func вернула None (поста нет), валидаторов нет вовсе и ответ
+всегда строит представление.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Max
+from django.views.decorators.http import condition
+
+from core.routers import used_replica
+
+from .caching import get_feed_changed, get_feed_generation
+from .models import Post
+
+
+def feed_state(request, *args, **kwargs):
+    return (), None
+
+
+def post_state(request, post_id):
+    # Валидаторы сверяются с основной базой: реплика могла отстать.
+    row = Post.objects.using(DEFAULT_DB_ALIAS).filter(pk=post_id).annotate(
+        last_comment=Max('comments__updated_at')
+    ).values_list('updated_at', 'comments_count', 'last_comment').first()
+    if row is None:
+        return None
+    return row, max(filter(None, (row[0], row[2])))
+
+
+def _successful_only(view):
+    """
+    Снимает валидаторы с ответов, кроме 200 и 304, и с ответов,
+    собранных по данным отстающей реплики.
+    """
+    @wraps(view)
+    def inner(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if response.status_code not in (200, 304) or used_replica():
+            del response['ETag']
+            del response['Last-Modified']
+        return response
+
+    return inner
+
+
+def conditional(state_func=feed_state):
+    """
+    condition() с валидаторами из поколения лент и state_func, которая
+    возвращает дополнительные части ETag и время изменения в базе или
+    None, если объекта нет.
+    """
+    def get_state(request, *args, **kwargs):
+        if not hasattr(request, '_conditional_state'):
+            request._conditional_state = state_func(request, *args, **kwargs)
+        return request._conditional_state
+
+    def etag(request, *args, **kwargs):
+        state = get_state(request, *args, **kwargs)
+        if state is None:
+            return None
+        parts, _ = state
+        user = (0, '')
+        if request.user.is_authenticated:
+            user = (request.user.pk, request.META.get('CSRF_COOKIE', ''))
+        raw = ':'.join(map(str, (*parts, get_feed_generation(), *user)))
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        state = get_state(request, *args, **kwargs)
+        if state is None or request.user.is_authenticated:
+            return None
+        _, moment = state
+        changed = get_feed_changed()
+        if changed is None:
+            return None
+        changed = datetime.fromtimestamp(changed, tz=timezone.utc)
+        return max(moment, changed) if moment else changed
+
+    def decorator(view):
+        return _successful_only(condition(
+            etag_func=etag, last_modified_func=last_modified
+        )(view))
+
+    return decorator
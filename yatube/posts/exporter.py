@@ -0,0 +1,185 @@
+"""
+Потоковая выгрузка постов с комментариями в JSONL или CSV.
+
+Записи в том же виде, что читает import_content: за каждым постом
+идут его комментарии отдельными строками. Посты читаются через
+iterator() пачками по CHUNK_SIZE, комментарии добираются одним запросом
+на пачку, поэтому расход памяти не зависит от размера таблиц.
+
+export_changes выгружает только изменённое после контрольной точки:
+следы удалений и посты с комментариями по индексу updated_at. Каждая
+запись несёт id, так что получатель применяет их как delete и upsert.
+Следы, которые контрольная точка уже покрыла, удаляет prune_deletions.
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Comment, Deletion, Post
+
+
+CHUNK_SIZE = 500
+
+FORMATS = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+CSV_FIELDS = (
+    'type', 'id', 'post', 'author', 'group', 'text', 'pub_date', 'created',
+    'updated_at', 'deleted'
+)
+
+# Транзакция, начатая до контрольной точки, может зафиксироваться после
+# неё с более ранним updated_at: следующая выгрузка захватывает столько
+# секунд до точки, получатель применяет записи идемпотентно.
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+def parse_moment(value, end=False):
+    """
+    Дата или дата со временем из фильтра. Для даты без времени берётся
+    начало дня, а при end=True — начало следующего дня.
+    """
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'неверная дата {value!r}')
+        if end:
+            day += timedelta(days=1)
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def post_record(post):
+    return {
+        'type': 'post',
+        'id': post.pk,
+        'author': post.author.username,
+        'group': post.group.slug if post.group else None,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'updated_at': post.updated_at.isoformat(),
+    }
+
+
+def comment_record(comment):
+    return {
+        'type': 'comment',
+        'id': comment.pk,
+        'post': comment.post_id,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+        'updated_at': comment.updated_at.isoformat(),
+    }
+
+
+def _posts():
+    return Post.objects.select_related('author', 'group').only(
+        'text', 'pub_date', 'updated_at', 'author__username', 'group__slug'
+    )
+
+
+def _comments():
+    return Comment.objects.select_related('author').only(
+        'text', 'created', 'updated_at', 'post_id', 'author__username'
+    )
+
+
+def export_records(since=None, until=None):
+    """Посты за период [since, until) и их комментарии в порядке id."""
+    posts = _posts().order_by('pk')
+    if since is not None:
+        posts = posts.filter(pub_date__gte=since)
+    if until is not None:
+        posts = posts.filter(pub_date__lt=until)
+
+    posts = posts.iterator(chunk_size=CHUNK_SIZE)
+    while True:
+        chunk = list(islice(posts, CHUNK_SIZE))
+        if not chunk:
+            return
+        comments = {}
+        for comment in _comments().filter(
+            post__in=[post.pk for post in chunk]
+        ).order_by('pk'):
+            comments.setdefault(comment.post_id, []).append(comment)
+
+        for post in chunk:
+            yield post_record(post)
+            for comment in comments.get(post.pk, ()):
+                yield comment_record(comment)
+
+
+def _deletions(since=None, until=None):
+    deletions = Deletion.objects.order_by('deleted_at', 'pk')
+    if since is not None:
+        deletions = deletions.filter(deleted_at__gt=since)
+    if until is not None:
+        deletions = deletions.filter(deleted_at__lte=until)
+    return deletions
+
+
+def export_changes(since=None, until=None):
+    """
+    Изменения за (since, until]: сначала удаления, затем посты и
+    комментарии (они ссылаются на посты). Без since — всё. Удаления идут
+    первыми: SQLite отдаёт id удалённой последней строки новой, и
+    пересозданная запись должна прийти получателю после следа прежней.
+    """
+    for deletion in _deletions(since, until).iterator(CHUNK_SIZE):
+        yield {
+            'type': deletion.kind,
+            'id': deletion.record_id,
+            'deleted': True,
+            'updated_at': deletion.deleted_at.isoformat(),
+        }
+    for post in _posts().changed_since(since, until).iterator(CHUNK_SIZE):
+        yield post_record(post)
+    for comment in _comments().changed_since(since, until).iterator(
+        CHUNK_SIZE
+    ):
+        yield comment_record(comment)
+
+
+def prune_deletions(checkpoint):
+    """
+    Удаляет следы, которые выгрузка до checkpoint уже отдала с учётом
+    перекрытия SYNC_OVERLAP. Возвращает число удалённых.
+    """
+    deleted, _ = _deletions(until=checkpoint - SYNC_OVERLAP).delete()
+    return deleted
+
+
+def render_jsonl(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    """Псевдофайл для csv.writer: возвращает строку вместо записи."""
+    def write(self, value):
+        return value
+
+
+def render_csv(records):
+    writer = csv.DictWriter(_Echo(), CSV_FIELDS)
+    yield writer.writeheader()
+    for record in records:
+        yield writer.writerow(record)
+
+
+RENDERERS = {
+    'jsonl': render_jsonl,
+    'csv': render_csv,
+}
@@ -0,0 +1,228 @@
+"""
+Пакетный импорт постов, комментариев и подписок из архивов.
+
+Записи проверяются правилами PostForm и CommentForm, авторы и группы
+ищутся по словарям в памяти, а в базу строки пишутся через bulk_create
+пачками, каждая в своей транзакции. Побочные эффекты сигналов (ленты,
+счётчики, поисковый индекс, кеш) пересчитывают bulk_create менеджеров.
+Даты из архива выставляются после вставки одним UPDATE на пачку.
+"""
+import csv
+import json
+from collections import Counter
+
+from django.core.management.color import no_style
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .forms import CommentForm, PostForm
+from .models import Comment, Follow, Group, Post, User
+
+
+BATCH_SIZE = 1000
+
+# Строк в одном UPDATE ... CASE: по два параметра на строку.
+DATES_BATCH_SIZE = 400
+
+KINDS = ('post', 'comment', 'follow')
+
+
+class RecordError(ValueError):
+    pass
+
+
+def read_jsonl(stream, kind=None):
+    for line in stream:
+        if line.strip():
+            record = json.loads(line)
+            if isinstance(record, dict):
+                record.setdefault('type', kind)
+            yield record
+
+
+def read_csv(stream, kind=None):
+    for record in csv.DictReader(stream):
+        if not record.get('type'):
+            record['type'] = kind
+        yield record
+
+
+def _restore_dates(model, field, objs):
+    """Проставляет даты из архива, которые bulk_create заменил на now()."""
+    dates = [(obj.pk, obj._archive_date) for obj in objs if obj._archive_date]
+    for start in range(0, len(dates), DATES_BATCH_SIZE):
+        batch = dates[start:start + DATES_BATCH_SIZE]
+        whens = [
+            When(pk=pk, then=Value(date, output_field=DateTimeField()))
+            for pk, date in batch
+        ]
+        model.objects.filter(pk__in=[pk for pk, _ in batch]).update(**{
+            field: Case(*whens, output_field=DateTimeField())
+        })
+
+
+def _form_errors(form):
+    return '; '.join(
+        f'{name}: {" ".join(errors)}' for name, errors in form.errors.items()
+    )
+
+
+class ContentImporter:
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.users = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.buffers = {kind: [] for kind in KINDS}
+        self.created = Counter()
+        self.errors = []
+
+    def add(self, number, record):
+        """Проверяет запись и откладывает её в буфер своего типа."""
+        try:
+            if not isinstance(record, dict):
+                raise RecordError('запись должна быть объектом')
+            kind = record.get('type')
+            if kind not in KINDS:
+                raise RecordError(f'неизвестный тип записи: {kind!r}')
+            obj = getattr(self, '_build_' + kind)(record)
+        except RecordError as error:
+            self.errors.append((number, str(error)))
+            return
+        self.buffers[kind].append((number, obj))
+        if len(self.buffers[kind]) >= self.batch_size:
+            self.flush(kind)
+
+    def flush(self, kind=None):
+        """
+        Пишет накопленные записи. Комментарии ссылаются на посты,
+        поэтому перед ними всегда сбрасывается буфер постов.
+        """
+        kinds = KINDS if kind is None else KINDS[:KINDS.index(kind) + 1]
+        for kind in kinds:
+            batch, self.buffers[kind] = self.buffers[kind], []
+            if not batch:
+                continue
+            try:
+                with transaction.atomic():
+                    getattr(self, '_write_' + kind)(batch)
+            except IntegrityError as error:
+                # Строку заняли параллельно, уже после проверки пачки.
+                self.errors.extend(
+                    (number, f'пачка не записана: {error}')
+                    for number, _ in batch
+                )
+
+    def _user(self, record, field):
+        username = record.get(field)
+        if username not in self.users:
+            raise RecordError(f'{field}: нет пользователя {username!r}')
+        return self.users[username]
+
+    def _date(self, record, field):
+        value = record.get(field)
+        if not value:
+            return None
+        date = parse_datetime(value)
+        if date is None:
+            raise RecordError(f'{field}: неверная дата {value!r}')
+        # Дата без часового пояса считается датой в поясе сайта.
+        if timezone.is_naive(date):
+            date = timezone.make_aware(date)
+        return date
+
+    def _build_post(self, record):
+        form = PostForm(data={'text': record.get('text')})
+        if not form.is_valid():
+            raise RecordError(_form_errors(form))
+        post = form.save(commit=False)
+        post.author_id = self._user(record, 'author')
+        if record.get('group'):
+            if record['group'] not in self.groups:
+                raise RecordError(f'group: нет группы {record["group"]!r}')
+            post.group_id = self.groups[record['group']]
+        if record.get('id'):
+            try:
+                post.pk = int(record['id'])
+            except (TypeError, ValueError):
+                raise RecordError(f'id: неверный id {record["id"]!r}')
+        post._archive_date = self._date(record, 'pub_date')
+        return post
+
+    def _build_comment(self, record):
+        form = CommentForm(data={'text': record.get('text')})
+        if not form.is_valid():
+            raise RecordError(_form_errors(form))
+        comment = form.save(commit=False)
+        comment.author_id = self._user(record, 'author')
+        try:
+            comment.post_id = int(record.get('post'))
+        except (TypeError, ValueError):
+            raise RecordError(f'post: неверный id {record.get("post")!r}')
+        comment._archive_date = self._date(record, 'created')
+        return comment
+
+    def _build_follow(self, record):
+        follow = Follow(
+            user_id=self._user(record, 'user'),
+            author_id=self._user(record, 'author')
+        )
+        if follow.user_id == follow.author_id:
+            raise RecordError('нельзя подписаться на самого себя')
+        return follow
+
+    def _write_post(self, batch):
+        explicit = {post.pk for _, post in batch if post.pk is not None}
+        taken = set(Post.objects.filter(
+            pk__in=explicit
+        ).values_list('pk', flat=True))
+        posts = []
+        for number, post in batch:
+            if post.pk is None:
+                posts.append(post)
+            elif post.pk in taken:
+                self.errors.append((number, f'id: пост {post.pk} уже есть'))
+            else:
+                taken.add(post.pk)
+                posts.append(post)
+        Post.objects.bulk_create(posts)
+        _restore_dates(Post, 'pub_date', posts)
+        if explicit:
+            # Явные id обходят последовательность (на PostgreSQL).
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [Post]
+                ):
+                    cursor.execute(sql)
+        self.created['post'] += len(posts)
+
+    def _write_comment(self, batch):
+        existing = set(Post.objects.filter(
+            pk__in={comment.post_id for _, comment in batch}
+        ).values_list('pk', flat=True))
+        comments = []
+        for number, comment in batch:
+            if comment.post_id in existing:
+                comments.append(comment)
+            else:
+                self.errors.append(
+                    (number, f'post: нет поста {comment.post_id}')
+                )
+        Comment.objects.bulk_create(comments)
+        _restore_dates(Comment, 'created', comments)
+        self.created['comment'] += len(comments)
+
+    def _write_follow(self, batch):
+        existing = set(Follow.objects.filter(
+            user_id__in={follow.user_id for _, follow in batch}
+        ).values_list('user_id', 'author_id'))
+        follows = []
+        for _, follow in batch:
+            pair = (follow.user_id, follow.author_id)
+            if pair in existing:
+                continue
+            existing.add(pair)
+            follows.append(follow)
+        Follow.objects.bulk_create(follows)
+        self.created['follow'] += len(follows)
@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import (
+    override_settings, setup_test_environment, teardown_test_environment
+)
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Смешанная нагрузка на файловую базу SQLite: потоки читают '
+        'ленты и одновременно публикуют посты и комментарии. Сравнивает '
+        'пропускную способность при разных режимах журнала.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument(
+            '--duration', type=float, default=5.0,
+            help='секунд нагрузки на каждый режим'
+        )
+        parser.add_argument(
+            '--journal-mode', action='append', dest='journal_modes',
+            choices=('wal', 'delete', 'truncate'),
+            help='режим журнала (можно несколько раз; по умолчанию wal '
+                 'и delete)'
+        )
+        parser.add_argument('--output', help='файл для JSON с результатами')
+
+    def handle(self, *args, **options):
+        results = {}
+        for mode in options['journal_modes'] or ['wal', 'delete']:
+            pragmas = {**settings.SQLITE_PRAGMAS, 'journal_mode': mode}
+            with override_settings(
+                SQLITE_PRAGMAS=pragmas,
+                DEFAULT_FILE_STORAGE=settings.MEDIA_STORAGES['memory'],
+                THUMBNAIL_STORAGE=settings.MEDIA_STORAGES['memory'],
+            ):
+                results[mode] = self._measure(options)
+            self.stderr.write(
+                f"{mode}: чтение {results[mode]['read'].get('throughput_rps')}"
+                f" rps, запись {results[mode]['write'].get('throughput_rps')}"
+                f" rps, ошибок {results[mode]['read']['errors']}"
+                f"/{results[mode]['write']['errors']}"
+            )
+
+        report = json.dumps(results, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(report)
+        else:
+            self.stdout.write(report)
+
+    def _measure(self, options):
+        # WAL работает только с файлом: тестовая база в памяти не годится.
+        if connection.vendor != 'sqlite':
+            return self._run(options)
+        with tempfile.TemporaryDirectory() as directory:
+            connection.settings_dict['TEST']['NAME'] = os.path.join(
+                directory, 'benchmark.sqlite3'
+            )
+            try:
+                return self._run(options)
+            finally:
+                connection.settings_dict['TEST']['NAME'] = None
+
+    def _run(self, options):
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            benchmark.seed({
+                'users': options['users'],
+                'posts': options['posts'],
+                'follows': options['users'] * 5,
+                'comments': options['posts'],
+                'images': 0,
+            })
+            return benchmark.run_mixed(
+                readers=options['readers'],
+                writers=options['writers'],
+                duration=options['duration'],
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
@@ -0,0 +1,104 @@
+import json
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import (
+    override_settings, setup_test_environment, teardown_test_environment
+)
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет отдельную тестовую базу и замеряет время ответа, '
+        'число запросов и пропускную способность всех адресов posts.'
+    )
+
+    def add_arguments(self, parser):
+        for name, default in benchmark.SCALE.items():
+            parser.add_argument(
+                f'--{name}', type=int, default=default,
+                help=f'сколько создать: {name} (по умолчанию {default})'
+            )
+        parser.add_argument(
+            '--transport', choices=('client', 'wsgi'), default='client',
+            help='тестовый клиент Django или настоящий WSGI-сервер'
+        )
+        parser.add_argument(
+            '--media', choices=settings.MEDIA_STORAGES, default='memory',
+            help='хранилище картинок на время замера (по умолчанию memory)'
+        )
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--cold-cache', action='store_true',
+            help='чистить кеш перед каждым запросом'
+        )
+        parser.add_argument(
+            '--route', action='append', dest='routes',
+            help='замерить только этот маршрут (можно несколько раз)'
+        )
+        parser.add_argument('--output', help='файл для JSON с результатами')
+        parser.add_argument(
+            '--compare', help='JSON прошлого замера для сравнения p50'
+        )
+
+    def handle(self, *args, **options):
+        storage = settings.MEDIA_STORAGES[options['media']]
+        with override_settings(
+            DEFAULT_FILE_STORAGE=storage,
+            THUMBNAIL_STORAGE=storage,
+            THUMBNAIL_WORKERS=0,
+        ):
+            result = self._measure(options)
+
+        report = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(report)
+        else:
+            self.stdout.write(report)
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as baseline:
+                changes = benchmark.compare(json.load(baseline), result)
+            for name, change in sorted(changes.items()):
+                self.stderr.write(f'{name}: p50 {change:+.1f}%')
+
+    def _measure(self, options):
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            scale = benchmark.seed(
+                {name: options[name] for name in benchmark.SCALE}
+            )
+            result = benchmark.run(
+                transport=options['transport'],
+                requests=options['requests'],
+                warmup=options['warmup'],
+                cold_cache=options['cold_cache'],
+                only=options['routes'],
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        result.update(
+            scale=scale, media=options['media'], commit=self._commit()
+        )
+        return result
+
+    def _commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from posts.media import COLLECT_GRACE, collect
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает ссылки на картинки и удаляет файлы, на которые '
+        'не ссылается ни один пост, вместе с их миниатюрами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='только показать, что будет удалено'
+        )
+        parser.add_argument(
+            '--grace', type=int,
+            default=int(COLLECT_GRACE.total_seconds()),
+            help='не трогать файлы моложе стольких секунд '
+                 '(по умолчанию %(default)s): их могут сохранять прямо сейчас'
+        )
+
+    def handle(self, *args, **options):
+        names = collect(
+            dry_run=options['dry_run'],
+            grace=timedelta(seconds=options['grace'])
+        )
+        for name in names:
+            self.stdout.write(name)
+        verb = 'К удалению' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(f'{verb} файлов: {len(names)}'))
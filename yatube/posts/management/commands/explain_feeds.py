@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts.models import Post, Group, User, Comment
+from posts.timeline import get_timeline
+from posts.utils import KEYSET_ORDERING, POSTS_ON_PAGE
+
+
+class Command(BaseCommand):
+    help = (
+        'Печатает план выполнения запросов лент '
+        '(EXPLAIN QUERY PLAN в SQLite, EXPLAIN в PostgreSQL).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group', help='slug группы для group_list')
+        parser.add_argument('--author', help='username автора для profile')
+        parser.add_argument('--user', help='username читателя для follow')
+        parser.add_argument(
+            '--post', type=int, help='id поста для post_detail'
+        )
+
+    def handle(self, *args, **options):
+        group = self._get(Group, slug=options['group'])
+        author = self._get(User, username=options['author'])
+        user = self._get(User, username=options['user'])
+        post = self._get(Post, pk=options['post'])
+
+        feed = Post.objects.for_feed().order_by(*KEYSET_ORDERING)
+        queries = [
+            ('index', feed),
+            ('group_list', feed.filter(group=group)),
+            ('profile', feed.filter(author=author)),
+            (
+                'follow_index',
+                get_timeline(user).order_by(*KEYSET_ORDERING)
+            ),
+            ('post_detail comments', Comment.objects.filter(post=post)),
+        ]
+
+        self.stdout.write(f'Database: {connection.vendor}')
+        for name, queryset in queries:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(queryset[:POSTS_ON_PAGE].explain())
+            self.stdout.write('')
+
+    @staticmethod
+    def _get(model, **lookup):
+        """Объект из аргумента, иначе первый попавшийся из базы."""
+        field, value = next(iter(lookup.items()))
+        if value is not None:
+            try:
+                return model.objects.get(**lookup)
+            except model.DoesNotExist:
+                raise CommandError(
+                    f'Не найдено: {model.__name__} с {field}={value!r}'
+                )
+        return model.objects.order_by('pk').first()
@@ -0,0 +1,97 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts.exporter import (
+    RENDERERS, SYNC_OVERLAP, export_changes, export_records, parse_moment,
+    prune_deletions
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты с комментариями в JSONL или CSV '
+        'в формате, который читает import_content. С --changed-since '
+        'или --checkpoint выгружает только изменения и удаления.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', choices=RENDERERS, default='jsonl',
+            help='формат выгрузки (по умолчанию jsonl)'
+        )
+        parser.add_argument(
+            '--output', help='файл для выгрузки (по умолчанию stdout)'
+        )
+        parser.add_argument(
+            '--since', help='посты начиная с этой даты (включительно)'
+        )
+        parser.add_argument(
+            '--until', help='посты до этой даты (включительно для даты)'
+        )
+        parser.add_argument(
+            '--changed-since',
+            help='только записи, изменённые или удалённые после момента'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='файл контрольной точки: выгрузить изменения после неё '
+                 'и записать новую точку после успешной выгрузки'
+        )
+        parser.add_argument(
+            '--prune', action='store_true',
+            help='после записи контрольной точки удалить следы удалений, '
+                 'которые она покрыла; только если получатель один'
+        )
+
+    def handle(self, *args, **options):
+        incremental = options['changed_since'] or options['checkpoint']
+        if options['prune'] and not options['checkpoint']:
+            raise CommandError('--prune работает только с --checkpoint')
+        if incremental and (options['since'] or options['until']):
+            raise CommandError(
+                '--since/--until нельзя сочетать с инкрементальной выгрузкой'
+            )
+        try:
+            since = parse_moment(options['since'])
+            until = parse_moment(options['until'], end=True)
+            changed_since = parse_moment(
+                options['changed_since'] or self._read_checkpoint(options)
+            )
+        except ValueError as error:
+            raise CommandError(error)
+
+        if incremental:
+            until = timezone.now()
+            if changed_since is not None:
+                changed_since -= SYNC_OVERLAP
+            records = export_changes(changed_since, until)
+        else:
+            records = export_records(since, until)
+
+        self._write(RENDERERS[options['format']](records), options['output'])
+        if options['checkpoint']:
+            self._write_checkpoint(options['checkpoint'], until, options)
+
+    def _write(self, chunks, path):
+        if path:
+            with open(path, 'w', encoding='utf-8', newline='') as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+
+    def _write_checkpoint(self, path, until, options):
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(until.isoformat())
+        if options['prune']:
+            pruned = prune_deletions(until)
+            self.stderr.write(f'Удалено следов удалений: {pruned}')
+
+    def _read_checkpoint(self, options):
+        path = options['checkpoint']
+        if not path or not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as file:
+            return file.read().strip()
@@ -0,0 +1,81 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import get_ready_thumbnail
+from posts.utils import KEYSET_ORDERING, POSTS_ON_PAGE
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает объём картинок на страницах ленты: одна миниатюра '
+        '960x339 против варианта из srcset, который выберет браузер.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=5)
+        parser.add_argument(
+            '--viewport', type=int, default=375,
+            help='ширина окна клиента в CSS-пикселях'
+        )
+        parser.add_argument('--dpr', type=float, default=2.0)
+        parser.add_argument(
+            '--no-webp', action='store_true',
+            help='клиент не поддерживает WebP'
+        )
+
+    def handle(self, *args, **options):
+        needed_width = options['viewport'] * options['dpr']
+        extension = 'jpeg' if options['no_webp'] else 'webp'
+        posts = Post.objects.for_feed().order_by(*KEYSET_ORDERING)
+
+        total_before = total_after = 0
+        for page in range(options['pages']):
+            start = page * POSTS_ON_PAGE
+            before = after = 0
+            for post in posts[start:start + POSTS_ON_PAGE]:
+                if not post.image:
+                    continue
+                single = self._single_image_bytes(post)
+                before += single
+                after += self._srcset_bytes(
+                    post, needed_width, extension
+                ) or single
+            total_before += before
+            total_after += after
+            self.stdout.write(
+                f'Страница {page + 1}: {before} Б -> {after} Б'
+            )
+
+        saved = 100 * (1 - total_after / total_before) if total_before else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Всего: {total_before} Б -> {total_after} Б '
+            f'(экономия {saved:.0f}%)'
+        ))
+
+    @staticmethod
+    def _single_image_bytes(post):
+        thumbnail = get_ready_thumbnail(post.image)
+        if thumbnail is not None and thumbnail.exists():
+            return thumbnail.storage.size(thumbnail.name)
+        if post.image.storage.exists(post.image.name):
+            return post.image.size
+        return 0
+
+    @staticmethod
+    def _srcset_bytes(post, needed_width, extension):
+        variants = [
+            variant for variant in post.variants if extension in variant
+        ]
+        if not variants:
+            return 0
+        chosen = next(
+            (
+                variant for variant in variants
+                if variant['width'] >= needed_width
+            ),
+            variants[-1]
+        )
+        if not default_storage.exists(chosen[extension]):
+            return 0
+        return chosen[extension + '_bytes']
@@ -0,0 +1,70 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.importer import (
+    BATCH_SIZE, KINDS, ContentImporter, read_csv, read_jsonl
+)
+
+
+READERS = {'jsonl': read_jsonl, 'csv': read_csv}
+
+MAX_REPORTED_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует посты, комментарии и подписки из JSONL или CSV. '
+        'Тип записи берётся из поля type или из --type.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='файл с данными или - для stdin')
+        parser.add_argument(
+            '--format', choices=READERS,
+            help='формат файла (по умолчанию по расширению)'
+        )
+        parser.add_argument(
+            '--type', choices=KINDS, dest='kind',
+            help='тип записей, у которых нет поля type'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help=f'строк в одной транзакции (по умолчанию {BATCH_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'jsonl'
+        )
+        importer = ContentImporter(batch_size=options['batch_size'])
+
+        started = time.monotonic()
+        stream = sys.stdin if path == '-' else open(
+            path, encoding='utf-8', newline=''
+        )
+        try:
+            records = READERS[file_format](stream, options['kind'])
+            rows = 0
+            for rows, record in enumerate(records, start=1):
+                importer.add(rows, record)
+            importer.flush()
+        except ValueError as error:
+            raise CommandError(f'Строка {rows + 1}: {error}')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        elapsed = time.monotonic() - started
+
+        for number, error in importer.errors[:MAX_REPORTED_ERRORS]:
+            self.stderr.write(f'Строка {number}: {error}')
+        created = ', '.join(
+            f'{kind}: {importer.created[kind]}' for kind in KINDS
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано строк: {rows}, создано ({created}), '
+            f'ошибок: {len(importer.errors)}, '
+            f'{rows / elapsed if elapsed else 0:.0f} строк/с'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики и исправляет расхождения.'
+
+    def handle(self, *args, **options):
+        stats, posts = reconcile()
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено строк статистики: {stats}, постов: {posts}'
+        ))
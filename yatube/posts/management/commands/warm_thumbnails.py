@@ -0,0 +1,50 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.models import Post
+from posts.thumbnails import prepare_images
+
+
+def _init_worker():
+    django.setup()
+
+
+def _prepare(post):
+    return prepare_images(*post)
+
+
+class Command(BaseCommand):
+    help = (
+        'Заранее создаёт миниатюры и адаптивные варианты картинок '
+        'всех постов в пуле процессов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='число процессов (по умолчанию по числу ядер)'
+        )
+
+    def handle(self, *args, **options):
+        posts = list(
+            Post.objects.exclude(image='').values_list('pk', 'image')
+        )
+        # Дочерние процессы не должны делить соединение с родителем.
+        connections.close_all()
+
+        started = time.monotonic()
+        with ProcessPoolExecutor(
+            max_workers=options['processes'], initializer=_init_worker
+        ) as executor:
+            results = list(executor.map(_prepare, posts, chunksize=16))
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинок готово: {sum(results)} из {len(posts)} '
+            f'за {elapsed:.1f} с'
+        ))
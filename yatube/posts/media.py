@@ -0,0 +1,182 @@
+"""
+Картинки постов, адресуемые содержимым.
+
+Загрузка хешируется по мере чтения и сохраняется под именем
+posts/<первые два знака хеша>/<хеш>.<расширение>. Одинаковые картинки
+хранятся один раз, а миниатюры sorl-thumbnail и варианты, привязанные
+к имени файла, тоже создаются один раз. ImageBlob считает посты,
+которые ссылаются на файл; файлы без ссылок удаляет команда
+collect_media.
+
+store сначала отмечает файл в ImageBlob (claimed_at), а потом пишет
+его, поэтому collect не трогает файлы моложе COLLECT_GRACE: между
+сохранением картинки и постом со ссылкой на неё ссылок ещё нет.
+"""
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.db.models import Count, F
+from django.utils import timezone
+from sorl.thumbnail import delete as delete_with_thumbnails
+
+from .models import ImageBlob, Post
+
+
+UPLOAD_TO = 'posts/'
+
+VARIANTS_DIR = 'posts/variants/'
+
+COLLECT_GRACE = timedelta(hours=1)
+
+
+def claim(name, size=0):
+    """Отмечает, что файл только что сохранён или переиспользован."""
+    now = timezone.now()
+    if not ImageBlob.objects.filter(name=name).update(claimed_at=now):
+        ImageBlob.objects.get_or_create(
+            name=name, defaults={'size': size, 'claimed_at': now}
+        )
+
+
+def store(file):
+    """
+    Сохраняет загрузку под её хешем, если такого файла ещё нет,
+    и возвращает имя в хранилище. Загрузка читается один раз: кусками
+    в хеш и во временный файл, из которого и идёт запись.
+    """
+    digest = hashlib.sha256()
+    with tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    ) as copy:
+        for chunk in file.chunks():
+            digest.update(chunk)
+            copy.write(chunk)
+        hexdigest = digest.hexdigest()
+        extension = os.path.splitext(file.name or '')[1].lower()
+        name = f'{UPLOAD_TO}{hexdigest[:2]}/{hexdigest}{extension}'
+        claim(name, copy.tell())
+        if not default_storage.exists(name):
+            copy.seek(0)
+            saved = default_storage.save(name, File(copy, name))
+            if saved != name:
+                # Тот же файл успел записать параллельный запрос.
+                default_storage.delete(saved)
+    return name
+
+
+def retain(name):
+    if not name:
+        return
+    blob, created = ImageBlob.objects.get_or_create(
+        name=name, defaults={'refs': 1}
+    )
+    if not created:
+        ImageBlob.objects.filter(name=name).update(refs=F('refs') + 1)
+
+
+def release(name):
+    if name:
+        ImageBlob.objects.filter(name=name, refs__gt=0).update(
+            refs=F('refs') - 1
+        )
+
+
+def reconcile():
+    """Пересчитывает ссылки по постам; возвращает число исправлений."""
+    counts = dict(
+        Post.objects.exclude(image='').order_by().values_list('image')
+        .annotate(total=Count('pk'))
+    )
+    blobs = {blob.name: blob for blob in ImageBlob.objects.all()}
+    ImageBlob.objects.bulk_create(
+        ImageBlob(name=name) for name in set(counts) - set(blobs)
+    )
+    fixed = 0
+    for name in counts.keys() | blobs.keys():
+        refs = counts.get(name, 0)
+        if name not in blobs or blobs[name].refs != refs:
+            ImageBlob.objects.filter(name=name).update(refs=refs)
+            fixed += 1
+    return fixed
+
+
+def walk(path):
+    """Все файлы хранилища под path, рекурсивно."""
+    try:
+        directories, files = default_storage.listdir(path)
+    except FileNotFoundError:
+        return
+    for file in files:
+        yield f'{path}{file}'
+    for directory in directories:
+        yield from walk(f'{path}{directory}/')
+
+
+def _variant_names():
+    names = set()
+    for post in Post.objects.exclude(image_variants='').only(
+        'image_variants'
+    ).iterator():
+        for variant in post.variants:
+            names.update(
+                value for key, value in variant.items()
+                if isinstance(value, str)
+            )
+    return names
+
+
+def _stale(name, cutoff):
+    try:
+        return default_storage.get_modified_time(name) < cutoff
+    except (FileNotFoundError, NotImplementedError):
+        return True
+
+
+def collect(dry_run=False, grace=COLLECT_GRACE):
+    """
+    Удаляет картинки без ссылок вместе с миниатюрами, а также файлы
+    в posts/, которых нет ни в одном посте. Файлы моложе grace
+    пропускаются, ссылки перепроверяются перед удалением каждого.
+    Возвращает удалённые имена.
+    """
+    reconcile()
+    cutoff = timezone.now() - grace
+    tracked = set(
+        ImageBlob.objects.filter(
+            refs=0, claimed_at__lt=cutoff
+        ).values_list('name', flat=True)
+    )
+    referenced = set(
+        Post.objects.exclude(image='').values_list('image', flat=True)
+    ) | _variant_names()
+    orphans = tracked | {
+        name for name in walk(UPLOAD_TO)
+        if name not in referenced and _stale(name, cutoff)
+    }
+    if dry_run:
+        return sorted(orphans)
+
+    deleted = []
+    for name in sorted(orphans):
+        if name.startswith(VARIANTS_DIR):
+            default_storage.delete(name)
+        elif name in tracked:
+            # Пост мог сослаться на файл после выборки: удаляем только
+            # если запись всё ещё без ссылок и не отмечена заново.
+            removed, _ = ImageBlob.objects.filter(
+                name=name, refs=0, claimed_at__lt=cutoff
+            ).delete()
+            if not removed:
+                continue
+            delete_with_thumbnails(name)
+        elif not ImageBlob.objects.filter(name=name).exists():
+            delete_with_thumbnails(name)
+        else:
+            continue
+        deleted.append(name)
+    return deleted
@@ -0,0 +1,81 @@
+from django.db import migrations
+
+# Стеммер — функция без моделей: индекс должен совпасть с тем, что
+# строит posts.search.
+from posts.stemmer import stem_text
+
+
+SEARCH_TABLE = 'posts_post_search'
+
+BATCH_SIZE = 500
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {SEARCH_TABLE} '
+            'USING fts5(text, comments)'
+        )
+        sql = (
+            f'INSERT INTO {SEARCH_TABLE} (rowid, text, comments) '
+            'VALUES (%s, %s, %s)'
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE TABLE {SEARCH_TABLE} ('
+            'post_id integer PRIMARY KEY REFERENCES posts_post (id) '
+            'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)'
+        )
+        schema_editor.execute(
+            f'CREATE INDEX {SEARCH_TABLE}_document_idx '
+            f'ON {SEARCH_TABLE} USING gin (document)'
+        )
+        sql = (
+            f'INSERT INTO {SEARCH_TABLE} (post_id, document) VALUES (%s, '
+            "setweight(to_tsvector('russian', %s), 'A') || "
+            "setweight(to_tsvector('russian', %s), 'D'))"
+        )
+    else:
+        return
+
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    post_ids = list(Post.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(post_ids), BATCH_SIZE):
+        batch = post_ids[start:start + BATCH_SIZE]
+        documents = {
+            pk: [text, []]
+            for pk, text in Post.objects.filter(
+                pk__in=batch
+            ).values_list('pk', 'text')
+        }
+        for post_id, text in Comment.objects.filter(
+            post__in=batch
+        ).order_by().values_list('post', 'text'):
+            documents[post_id][1].append(text)
+        rows = []
+        for pk, (text, comments) in documents.items():
+            comments = '\n'.join(comments)
+            if vendor == 'sqlite':
+                text, comments = stem_text(text), stem_text(comments)
+            rows.append((pk, text, comments))
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0023_user_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
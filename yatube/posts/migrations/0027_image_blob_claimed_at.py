@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:55
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0026_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageblob',
+            name='claimed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата загрузки'),
+        ),
+    ]
@@ -1,5 +1,11 @@
-from django.db import models
+import json
+from collections import Counter
+
+from django.core.files.storage import default_storage
+from django.db import connections, models, transaction
 from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from django.utils import timezone
 
 
 User = get_user_model()
@@ -18,6 +24,82 @@ class Group(models.Model):
         verbose_name_plural = 'Группы'
 
 
+class BulkCreateQuerySet(models.QuerySet):
+    def bulk_create(self, objs, batch_size=None, ignore_conflicts=False):
+        """
+        bulk_create, после которого у новых объектов есть id и на SQLite.
+        Вставка держит блокировку записи до конца транзакции, поэтому
+        строки без явного id — последние по pk, в порядке вставки.
+        """
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, batch_size, ignore_conflicts)
+            missing = [obj for obj in objs if obj.pk is None]
+            if (
+                missing and not ignore_conflicts
+                and connections[self.db].vendor == 'sqlite'
+            ):
+                pks = self.model._default_manager.using(self.db).order_by(
+                    '-pk'
+                ).values_list('pk', flat=True)[:len(missing)]
+                for obj, pk in zip(missing, reversed(list(pks))):
+                    obj.pk = pk
+        return objs
+
+
+class ChangeTrackingQuerySet(BulkCreateQuerySet):
+    def changed_since(self, since=None, until=None):
+        """
+        Строки, изменённые в (since, until], в порядке изменения:
+        основа инкрементальной выгрузки по updated_at.
+        """
+        rows = self
+        if since is not None:
+            rows = rows.filter(updated_at__gt=since)
+        if until is not None:
+            rows = rows.filter(updated_at__lte=until)
+        return rows.order_by('updated_at', 'pk')
+
+
+class PostQuerySet(ChangeTrackingQuerySet):
+    def for_feed(self):
+        """Посты для ленты: автор и группа подтягиваются одним запросом."""
+        return self.select_related('author', 'group').only(
+            'text',
+            'pub_date',
+            'updated_at',
+            'image',
+            'image_variants',
+            'author__username',
+            'author__first_name',
+            'author__last_name',
+            'group__title',
+            'group__slug',
+        )
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        bulk_create не шлёт post_save, поэтому ленты, счётчики,
+        поисковый индекс и кеш обновляются здесь.
+        """
+        from .caching import bump_feed_generation
+        from .media import retain
+        from .search import index_posts
+        from .stats import add_posts
+        from .timeline import fan_out_posts
+
+        objs = super().bulk_create(objs, *args, **kwargs)
+        created = [
+            (obj.pk, obj.author_id) for obj in objs if obj.pk is not None
+        ]
+        fan_out_posts(created)
+        add_posts(Counter(obj.author_id for obj in objs))
+        for obj in objs:
+            retain(obj.image.name)
+        index_posts(pk for pk, _ in created)
+        bump_feed_generation()
+        return objs
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст поста',
@@ -27,6 +109,11 @@ class Post(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+        db_index=True
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -47,15 +134,96 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        verbose_name='Число комментариев',
+        default=0,
+        editable=False
+    )
+    image_variants = models.TextField(
+        verbose_name='Варианты картинки',
+        blank=True,
+        editable=False,
+        help_text='JSON со списком уменьшенных копий картинки'
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
     def __str__(self):
         return self.text[:15]
 
+    # Поля, которые меняются только точечными update(): полная запись
+    # строки из устаревшего экземпляра не должна их затирать.
+    DERIVED_FIELDS = ('comments_count', 'image_variants')
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+        ):
+            # Неподгруженные поля (only(), for_feed()) не пишем: иначе
+            # Django дочитал бы каждое отдельным запросом.
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.DERIVED_FIELDS
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+    @cached_property
+    def variants(self):
+        return json.loads(self.image_variants) if self.image_variants else []
+
+    def _srcset(self, extension):
+        return ', '.join(
+            f"{default_storage.url(variant[extension])} {variant['width']}w"
+            for variant in self.variants
+            if extension in variant
+        )
+
+    @property
+    def jpeg_srcset(self):
+        return self._srcset('jpeg')
+
+    @property
+    def webp_srcset(self):
+        return self._srcset('webp')
+
+
+class CommentQuerySet(ChangeTrackingQuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """bulk_create не шлёт post_save: счётчики и индекс — здесь."""
+        from .search import append_comments
+        from .stats import add_counts, change_post_comments
+
+        objs = super().bulk_create(objs, *args, **kwargs)
+        add_counts('comments_count', Counter(obj.author_id for obj in objs))
+        for post_id, count in Counter(obj.post_id for obj in objs).items():
+            change_post_comments(post_id, count)
+        append_comments((obj.post_id, obj.text) for obj in objs)
+        return objs
+
 
 class Comment(models.Model):
     text = models.TextField(
@@ -66,6 +234,11 @@ class Comment(models.Model):
         verbose_name='Дата комментария',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+        db_index=True
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -79,8 +252,16 @@ class Comment(models.Model):
         verbose_name='Комментарий к посту'
     )
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['post', '-created'],
+                name='comment_post_created_idx'
+            ),
+        ]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -88,6 +269,26 @@ class Comment(models.Model):
         return self.text[:15]
 
 
+class FollowQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        bulk_create не шлёт post_save: счётчики, ленты и кеш обновляются
+        здесь. Конфликты при ignore_conflicts исправит reconcile_stats.
+        """
+        from .caching import bump_feed_generation
+        from .stats import add_counts
+        from .timeline import backfill
+
+        objs = super().bulk_create(objs, *args, **kwargs)
+        add_counts('following_count', Counter(obj.user_id for obj in objs))
+        add_counts('followers_count', Counter(obj.author_id for obj in objs))
+        for obj in objs:
+            backfill(obj.user_id, obj.author_id)
+        if objs:
+            bump_feed_generation()
+        return objs
+
+
 class Follow(models.Model):
     user = models.ForeignKey(
         User,
@@ -102,6 +303,8 @@ class Follow(models.Model):
         verbose_name='Автор'
     )
 
+    objects = FollowQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -110,3 +313,100 @@ class Follow(models.Model):
             )
 
         ]
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            )
+        ]
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя, обновляются сигналами."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Число постов', default=0
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Число подписчиков', default=0
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name='Число подписок', default=0
+    )
+    comments_count = models.PositiveIntegerField(
+        verbose_name='Число комментариев', default=0
+    )
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self):
+        return str(self.user_id)
+
+
+class ImageBlob(models.Model):
+    """Файл картинки, хранящийся один раз под хешем содержимого."""
+    name = models.CharField(
+        verbose_name='Файл', max_length=100, primary_key=True
+    )
+    size = models.PositiveIntegerField(verbose_name='Размер', default=0)
+    refs = models.PositiveIntegerField(
+        verbose_name='Число постов с картинкой', default=0
+    )
+    # Когда файл последний раз сохраняли или переиспользовали: свежие
+    # файлы без ссылок collect_media не трогает.
+    claimed_at = models.DateTimeField(
+        verbose_name='Дата загрузки', default=timezone.now
+    )
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return self.name
+
+
+class Deletion(models.Model):
+    """След удалённого поста или комментария для инкрементальной выгрузки."""
+    kind = models.CharField(verbose_name='Тип записи', max_length=20)
+    record_id = models.PositiveIntegerField(verbose_name='id записи')
+    deleted_at = models.DateTimeField(
+        verbose_name='Дата удаления',
+        auto_now_add=True,
+        db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'Удалённая запись'
+        verbose_name_plural = 'Удалённые записи'
+
+    def __str__(self):
+        return f'{self.kind} {self.record_id}'
@@ -0,0 +1,263 @@
+"""
+Полнотекстовый поиск по постам и комментариям к ним.
+
+Индекс живёт в отдельной таблице posts_post_search: на SQLite это
+виртуальная таблица FTS5 с основами слов из posts.stemmer, на PostgreSQL
+— tsvector с конфигурацией russian и GIN-индексом. Текст поста весит
+больше текста комментариев. На других СУБД поиск сводится к LIKE.
+
+Новый комментарий дописывается к документу своего поста: стеммится
+только его текст. Правка или удаление комментария переиндексирует пост;
+после удалений пост переиндексируется один раз при фиксации транзакции,
+поэтому удаление поста со всеми комментариями не пересобирает его
+документ на каждый комментарий.
+"""
+import threading
+
+from django.db import connection, transaction
+from django.utils.functional import cached_property
+
+from .models import Comment, Post
+from .stemmer import stem_text
+
+
+SEARCH_TABLE = 'posts_post_search'
+
+BATCH_SIZE = 500
+
+TEXT_WEIGHT = 10.0
+
+COMMENTS_WEIGHT = 1.0
+
+_pending = threading.local()
+
+
+def _has_index():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def _documents(post_ids):
+    """Тексты постов и склеенные комментарии к ним: {id: (text, comments)}."""
+    documents = {
+        pk: [text, []]
+        for pk, text in Post.objects.filter(
+            pk__in=post_ids
+        ).values_list('pk', 'text')
+    }
+    comments = Comment.objects.filter(post__in=post_ids).order_by()
+    for post_id, text in comments.values_list('post', 'text'):
+        documents[post_id][1].append(text)
+    return {
+        pk: (text, '\n'.join(comments))
+        for pk, (text, comments) in documents.items()
+    }
+
+
+def remove_posts(post_ids):
+    post_ids = list(post_ids)
+    if not post_ids or not _has_index():
+        return
+    column = 'rowid' if connection.vendor == 'sqlite' else 'post_id'
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE {column} IN ({placeholders})',
+            post_ids
+        )
+
+
+def index_posts(post_ids):
+    """Переиндексирует посты: старые записи удаляются, новые вставляются."""
+    post_ids = list(post_ids)
+    if not post_ids or not _has_index():
+        return
+    # Удаление и вставка — одна транзакция, иначе два параллельных
+    # комментария к посту вставят одну и ту же строку индекса.
+    with transaction.atomic():
+        remove_posts(post_ids)
+        _insert_documents(_documents(post_ids))
+
+
+def index_posts_on_commit(post_ids):
+    """
+    Переиндексирует посты после фиксации транзакции, каждый один раз.
+    Посты, удалённые к тому времени, в индекс не попадают.
+    """
+    if not hasattr(_pending, 'post_ids'):
+        _pending.post_ids = set()
+    _pending.post_ids.update(post_ids)
+    transaction.on_commit(_index_pending)
+
+
+def _index_pending():
+    # Первый сработавший обработчик забирает все накопленные посты,
+    # остальные находят пустое множество.
+    post_ids, _pending.post_ids = getattr(_pending, 'post_ids', set()), set()
+    index_posts(sorted(post_ids))
+
+
+def append_comments(comments):
+    """
+    Дописывает новые комментарии к документам их постов; comments —
+    пары (id поста, текст). Посты, которых нет в индексе, индексируются
+    целиком.
+    """
+    if not _has_index():
+        return
+    texts = {}
+    for post_id, text in comments:
+        texts.setdefault(post_id, []).append(text)
+    if connection.vendor == 'sqlite':
+        sql = (
+            f'UPDATE {SEARCH_TABLE} SET comments = comments || %s '
+            'WHERE rowid = %s'
+        )
+    else:
+        sql = (
+            f'UPDATE {SEARCH_TABLE} SET document = document || '
+            "setweight(to_tsvector('russian', %s), 'D') WHERE post_id = %s"
+        )
+    missing = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for post_id, post_texts in texts.items():
+            value = '\n' + '\n'.join(post_texts)
+            if connection.vendor == 'sqlite':
+                value = '\n' + stem_text(value)
+            cursor.execute(sql, [value, post_id])
+            if not cursor.rowcount:
+                missing.append(post_id)
+    index_posts(missing)
+
+
+def _insert_documents(documents):
+    if connection.vendor == 'sqlite':
+        sql = (
+            f'INSERT INTO {SEARCH_TABLE} (rowid, text, comments) '
+            'VALUES (%s, %s, %s)'
+        )
+        rows = [
+            (pk, stem_text(text), stem_text(comments))
+            for pk, (text, comments) in documents.items()
+        ]
+    else:
+        sql = (
+            f'INSERT INTO {SEARCH_TABLE} (post_id, document) VALUES (%s, '
+            "setweight(to_tsvector('russian', %s), 'A') || "
+            "setweight(to_tsvector('russian', %s), 'D'))"
+        )
+        rows = [
+            (pk, text, comments)
+            for pk, (text, comments) in documents.items()
+        ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def rebuild():
+    """Строит индекс заново по всем постам. Возвращает их число."""
+    if not _has_index():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    for start in range(0, len(post_ids), BATCH_SIZE):
+        index_posts(post_ids[start:start + BATCH_SIZE])
+    return len(post_ids)
+
+
+def _fts5_query(query):
+    """Основы слов запроса в кавычках: FTS5 ищет посты со всеми словами."""
+    return ' '.join(
+        '"{}"'.format(word.replace('"', '""'))
+        for word in stem_text(query).split()
+    )
+
+
+def _matches(query):
+    """
+    Отбор совпадений для запроса: (FROM и WHERE, порядок, параметры)
+    или None, если искать нечего.
+    """
+    if connection.vendor == 'sqlite':
+        match = _fts5_query(query)
+        if not match:
+            return None
+        return (
+            f'{SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s',
+            f'bm25({SEARCH_TABLE}, {TEXT_WEIGHT}, {COMMENTS_WEIGHT}), '
+            'rowid DESC',
+            [match],
+        )
+    if not query.strip():
+        return None
+    return (
+        f"{SEARCH_TABLE}, plainto_tsquery('russian', %s) AS query "
+        'WHERE document @@ query',
+        'ts_rank(document, query) DESC, post_id DESC',
+        [query],
+    )
+
+
+def _like(query):
+    return Post.objects.filter(text__icontains=query).order_by(
+        '-pub_date', '-pk'
+    ).values_list('pk', flat=True)
+
+
+def search_ids(query, limit=None, offset=0):
+    """id найденных постов, от самых релевантных к менее релевантным."""
+    if not _has_index():
+        ids = _like(query)[offset:]
+        return list(ids if limit is None else ids[:limit])
+    matches = _matches(query)
+    if matches is None:
+        return []
+    where, ordering, params = matches
+    column = 'rowid' if connection.vendor == 'sqlite' else 'post_id'
+    sql = f'SELECT {column} FROM {where} ORDER BY {ordering}'
+    if limit is not None or offset:
+        if limit is None:
+            limit = -1 if connection.vendor == 'sqlite' else None
+        sql += ' LIMIT %s OFFSET %s'
+        params = params + [limit, offset]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def count_matches(query):
+    if not _has_index():
+        return _like(query).count()
+    matches = _matches(query)
+    if matches is None:
+        return 0
+    where, _, params = matches
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM {where}', params)
+        return cursor.fetchone()[0]
+
+
+class SearchResults:
+    """
+    Результаты поиска для Paginator: число совпадений и id страницы
+    читаются отдельными запросами, без ограничения на глубину выдачи.
+    """
+    def __init__(self, query):
+        self.query = query
+
+    @cached_property
+    def _count(self):
+        return count_matches(self.query)
+
+    def count(self):
+        return self._count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start = index.start or 0
+            limit = None if index.stop is None else index.stop - start
+            return search_ids(self.query, limit, start)
+        return search_ids(self.query, 1, index)[0]
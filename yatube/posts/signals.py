@@ -0,0 +1,167 @@
+from django.db.models.signals import (
+    post_delete, post_init, post_save, pre_save
+)
+from django.dispatch import receiver
+
+from . import media, search, stats, timeline
+from .caching import bump_feed_generation
+from .models import Comment, Deletion, Follow, Group, Post, User, UserStats
+from .thumbnails import schedule_images
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_init, sender=Post)
+def track_image(sender, instance, **kwargs):
+    # Имя картинки, прочитанное из базы; без дескриптора FileField.
+    instance._loaded_image = instance.__dict__.get('image')
+
+
+@receiver(pre_save, sender=Post)
+def remember_image(sender, instance, **kwargs):
+    """Прежняя картинка поста; из базы читается, только если её меняли."""
+    image = instance.image
+    if not instance.pk:
+        instance._previous_image = ''
+    elif (
+        not instance._state.adding
+        and image._committed
+        and image.name == instance._loaded_image
+    ):
+        instance._previous_image = image.name
+    else:
+        instance._previous_image = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('image', flat=True).first()
+
+
+@receiver(pre_save, sender=Post)
+def store_image(sender, instance, raw=False, **kwargs):
+    """Новая загрузка сохраняется под хешем, повторная — не пишется."""
+    image = instance.image
+    if image and not image._committed and not raw:
+        image.name = media.store(image.file)
+        image._committed = True
+
+
+@receiver(post_save, sender=Post)
+def prepare_images(sender, instance, **kwargs):
+    if instance.image and instance.image.name != instance._previous_image:
+        schedule_images(instance)
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(sender, instance, **kwargs):
+    if instance.image.name != instance._previous_image:
+        media.release(instance._previous_image)
+        media.retain(instance.image.name)
+    instance._loaded_image = instance.image.name
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    media.release(instance.image.name)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clear_timeline(sender, instance, **kwargs):
+    timeline.remove(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=User)
+def create_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    stats.change(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.user_id, 'following_count', 1)
+        stats.change(instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    stats.change(instance.user_id, 'following_count', -1)
+    stats.change(instance.author_id, 'followers_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.author_id, 'comments_count', 1)
+        stats.change_post_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    stats.change(instance.author_id, 'comments_count', -1)
+    stats.change_post_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'text' in update_fields:
+        search.index_posts([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.remove_posts([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def record_deletion(sender, instance, **kwargs):
+    Deletion.objects.create(
+        kind=sender._meta.model_name, record_id=instance.pk
+    )
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, created, **kwargs):
+    if created:
+        search.append_comments([(instance.post_id, instance.text)])
+    else:
+        search.index_posts([instance.post_id])
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    search.index_posts_on_commit([instance.post_id])
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_feeds(sender, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    bump_feed_generation()
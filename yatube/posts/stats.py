@@ -0,0 +1,100 @@
+"""
+Денормализованные счётчики: посты, подписчики, подписки и комментарии.
+
+Счётчики меняются атомарно через F() в сигналах создания и удаления.
+Если строка статистики пропала, обновление просто ничего не меняет,
+а расхождения исправляет команда reconcile_stats.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, User, UserStats
+
+
+BATCH_SIZE = 500
+
+USER_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+    'comments_count': (Comment, 'author'),
+}
+
+
+def change(user_id, field, delta):
+    UserStats.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta}
+    )
+
+
+def change_post_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta
+    )
+
+
+def add_counts(field, counts_by_user):
+    for user_id, count in counts_by_user.items():
+        change(user_id, field, count)
+
+
+def add_posts(counts_by_author):
+    add_counts('posts_count', counts_by_author)
+
+
+def _count(model, field, outer='pk'):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef(outer)}).order_by()
+            .values(field).annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def reconcile():
+    """
+    Пересчитывает все счётчики пачками и исправляет расхождения.
+    Возвращает число исправленных строк статистики и постов.
+    """
+    UserStats.objects.bulk_create(
+        (
+            UserStats(user_id=user_id)
+            for user_id in User.objects.filter(
+                stats__isnull=True
+            ).values_list('pk', flat=True)
+        ),
+        batch_size=BATCH_SIZE
+    )
+
+    actual = UserStats.objects.annotate(**{
+        'actual_' + counter: _count(model, field, 'user_id')
+        for counter, (model, field) in USER_COUNTERS.items()
+    })
+    drifted_stats = []
+    for stats in actual.iterator(chunk_size=BATCH_SIZE):
+        drifted = False
+        for counter in USER_COUNTERS:
+            value = getattr(stats, 'actual_' + counter)
+            if getattr(stats, counter) != value:
+                setattr(stats, counter, value)
+                drifted = True
+        if drifted:
+            drifted_stats.append(stats)
+    UserStats.objects.bulk_update(
+        drifted_stats, list(USER_COUNTERS), batch_size=BATCH_SIZE
+    )
+
+    drifted_posts = []
+    posts = Post.objects.only('comments_count').annotate(
+        actual_comments_count=_count(Comment, 'post')
+    )
+    for post in posts.iterator(chunk_size=BATCH_SIZE):
+        if post.comments_count != post.actual_comments_count:
+            post.comments_count = post.actual_comments_count
+            drifted_posts.append(post)
+    Post.objects.bulk_update(
+        drifted_posts, ['comments_count'], batch_size=BATCH_SIZE
+    )
+    return len(drifted_stats), len(drifted_posts)
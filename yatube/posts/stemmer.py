@@ -0,0 +1,129 @@
+"""
+Стеммер для русского языка по алгоритму Snowball.
+
+Нужен поиску на SQLite: у FTS5 нет русской морфологии, поэтому
+в индекс и в запрос попадают уже обрезанные основы слов.
+"""
+import re
+
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+REFLEXIVE = ((), ('ся', 'сь'))
+ADJECTIVE = ((), (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею',
+))
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+VERB = (
+    (
+        'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+        'ет', 'ют', 'ны', 'ть', 'ешь', 'нно',
+    ),
+    (
+        'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+        'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+        'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю',
+    ),
+)
+NOUN = ((), (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+    'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+    'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+    'ья', 'я',
+))
+DERIVATIONAL = ((), ('ост', 'ость'))
+SUPERLATIVE = ((), ('ейш', 'ейше'))
+
+WORD_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile('[а-я]')
+
+
+def _region_after(word, start):
+    """Позиция после первой согласной, идущей за гласной, начиная со start."""
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _cut(word, groups):
+    """
+    Отрезает самое длинное окончание из групп. Окончания первой группы
+    должны стоять после «а» или «я». Если отрезать нечего, вернёт None.
+    """
+    found = None
+    for needs_a, suffixes in enumerate(groups):
+        for suffix in suffixes:
+            if word.endswith(suffix) and (
+                found is None or len(suffix) > len(found[0])
+            ):
+                found = (suffix, not needs_a)
+    if found is None:
+        return None
+    suffix, needs_a = found
+    stem = word[:-len(suffix)]
+    if needs_a and not stem.endswith(('а', 'я')):
+        return None
+    return stem
+
+
+def _cut_ending(word):
+    """Шаг 1: деепричастие, либо возвратная частица и окончание."""
+    result = _cut(word, PERFECTIVE_GERUND)
+    if result is not None:
+        return result
+    reflexive = _cut(word, REFLEXIVE)
+    if reflexive is not None:
+        word = reflexive
+    result = _cut(word, ADJECTIVE)
+    if result is not None:
+        participle = _cut(result, PARTICIPLE)
+        return result if participle is None else participle
+    for groups in (VERB, NOUN):
+        result = _cut(word, groups)
+        if result is not None:
+            return result
+    return word
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv = next(
+        (i + 1 for i, ch in enumerate(word) if ch in VOWELS), len(word)
+    )
+    r2 = _region_after(word, _region_after(word, 0)) - rv
+    prefix, word = word[:rv], word[rv:]
+
+    word = _cut_ending(word)
+    if word.endswith('и'):
+        word = word[:-1]
+
+    derivational = _cut(word, DERIVATIONAL)
+    if derivational is not None and len(derivational) >= r2:
+        word = derivational
+
+    superlative = _cut(word, SUPERLATIVE)
+    if superlative is not None:
+        word = superlative
+    if word.endswith('нн'):
+        word = word[:-1]
+    elif superlative is None and word.endswith('ь'):
+        word = word[:-1]
+    return prefix + word
+
+
+def stem_text(text):
+    """Текст в виде строки основ через пробел; латиница не меняется."""
+    return ' '.join(
+        stem(word) if CYRILLIC_RE.search(word) else word
+        for word in WORD_RE.findall(text.lower())
+    )
@@ -0,0 +1,67 @@
+"""
+Карточки постов для лент с кешированием по версии.
+
+Ключ карточки — id поста и хеш всего, что в ней видно: времени
+изменения, картинки и её миниатюры, группы, имени автора. Карточки
+не зависят от пользователя, поэтому их делят все ленты и посетители.
+Вся страница читается одним cache.get_many, рендерятся только промахи,
+и они же пишутся одним set_many. Тег возвращает список готовых
+карточек в порядке постов.
+"""
+import hashlib
+
+from django import template
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from posts.thumbnails import get_ready_thumbnail, prefetch_ready_thumbnails
+
+
+register = template.Library()
+
+CARD_TEMPLATE = 'includes/post_card.html'
+
+CARD_TIMEOUT = 60 * 60 * 24
+
+
+def card_version(post, show_author_link):
+    thumbnail = get_ready_thumbnail(post.image)
+    parts = (
+        post.updated_at.isoformat(),
+        post.image.name,
+        thumbnail.name if thumbnail else '',
+        post.image_variants,
+        post.group.slug if post.group else '',
+        post.author.username,
+        post.author.get_full_name(),
+        show_author_link,
+    )
+    raw = '\x1f'.join(map(str, parts))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def card_key(post, show_author_link=False):
+    return f'post_card:{post.pk}:{card_version(post, show_author_link)}'
+
+
+@register.simple_tag
+def post_cards(posts, show_author_link=False):
+    posts = list(posts)
+    prefetch_ready_thumbnails(posts)
+    keys = [card_key(post, show_author_link) for post in posts]
+    cards = cache.get_many(keys)
+
+    missing = {}
+    card_template = None
+    for post, key in zip(posts, keys):
+        if key in cards:
+            continue
+        card_template = card_template or get_template(CARD_TEMPLATE)
+        missing[key] = card_template.render({
+            'post': post, 'show_author_link': show_author_link
+        })
+    if missing:
+        cache.set_many(missing, CARD_TIMEOUT)
+        cards.update(missing)
+    return [mark_safe(cards[key]) for key in keys]
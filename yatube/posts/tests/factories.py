@@ -0,0 +1,79 @@
+"""
+Фабрики тестовых данных: всё создаётся пачками через bulk_create.
+
+Django 2.2 на SQLite не возвращает id после bulk_create, поэтому
+фабрики перечитывают созданные объекты по естественному ключу.
+Исключение — пост с картинкой: его загрузку обрабатывают сигналы
+сохранения, поэтому он создаётся обычным create.
+"""
+from itertools import cycle
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from ..models import Comment, Follow, Group, Post, User, UserStats
+
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+OTHER_GIF = SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\x00\xFF\x00')
+
+
+def make_users(count, prefix='user', **fields):
+    usernames = [f'{prefix}{i}' for i in range(count)]
+    User.objects.bulk_create(
+        User(username=username, **fields) for username in usernames
+    )
+    users = list(User.objects.filter(username__in=usernames).order_by('pk'))
+    UserStats.objects.bulk_create(UserStats(user=user) for user in users)
+    return users
+
+
+def make_groups(count, prefix='group'):
+    slugs = [f'{prefix}-{i}' for i in range(count)]
+    Group.objects.bulk_create(
+        Group(title=f'Группа {slug}', slug=slug, description='Описание')
+        for slug in slugs
+    )
+    return list(Group.objects.filter(slug__in=slugs).order_by('pk'))
+
+
+def make_posts(authors, count, groups=(None,), text='Тестовый пост'):
+    """count постов, авторы и группы берутся по кругу."""
+    authors, groups = cycle(authors), cycle(groups)
+    Post.objects.bulk_create(
+        Post(author=next(authors), group=next(groups), text=f'{text} {i}')
+        for i in range(count)
+    )
+    return list(Post.objects.order_by('-pk')[:count])[::-1]
+
+
+def make_follows(user, authors):
+    Follow.objects.bulk_create(
+        Follow(user=user, author=author) for author in authors
+    )
+
+
+def make_comments(post, authors, count, text='Тестовый комментарий'):
+    authors = cycle(authors)
+    Comment.objects.bulk_create(
+        Comment(post=post, author=next(authors), text=f'{text} {i}')
+        for i in range(count)
+    )
+
+
+def make_image_post(author, name='small.gif', content=SMALL_GIF,
+                    text='Тестовый пост'):
+    return Post.objects.create(
+        author=author,
+        text=text,
+        image=SimpleUploadedFile(
+            name=name, content=content, content_type='image/gif'
+        )
+    )
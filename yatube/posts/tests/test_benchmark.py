@@ -0,0 +1,42 @@
+from django.test import TestCase
+
+from .. import benchmark
+from ..models import Post, UserStats
+from .utils import memory_media
+
+
+@memory_media()
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        benchmark.seed({
+            'users': 5,
+            'groups': 2,
+            'posts': 30,
+            'follows': 10,
+            'comments': 40,
+            'images': 2,
+        })
+
+    def test_seed_scale(self):
+        """Наполнение создаёт заданный объём данных со счётчиками."""
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(UserStats.objects.count(), 6)
+        self.assertEqual(
+            Post.objects.exclude(image='').exclude(image_variants='').count(),
+            2
+        )
+
+    def test_run_covers_all_routes(self):
+        """Замер проходит по всем маршрутам posts без ошибок."""
+        result = benchmark.run(requests=3, warmup=0)
+        self.assertEqual(result['skipped'], [])
+        for name, route in result['routes'].items():
+            with self.subTest(route=name):
+                self.assertTrue(all(
+                    status < 400 for status in route['statuses']
+                ))
+                self.assertEqual(route['requests'], 3)
+                self.assertIn('p99_ms', route)
+                self.assertIn('queries_per_request', route)
@@ -0,0 +1,76 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, Client
+
+from ..models import Group, Post, User
+from ..templatetags.post_cards import card_key
+from ..thumbnails import get_ready_thumbnail, prepare_images
+from .factories import make_image_post, make_posts
+from .utils import commit_hooks, memory_media
+
+
+@memory_media()
+class PostCardsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='Описание'
+        )
+        cls.posts = make_posts([cls.user], 3, groups=[cls.group])
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.cache = mock.Mock(wraps=cache)
+        patcher = mock.patch(
+            'posts.templatetags.post_cards.cache', self.cache
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_page_cards_fetched_in_one_batch(self):
+        """Страница читает карточки одним get_many, пишет одним set_many."""
+        self.guest_client.get('/')
+        self.cache.get_many.assert_called_once()
+        self.assertEqual(len(self.cache.get_many.call_args[0][0]), 3)
+        self.cache.set_many.assert_called_once()
+        self.assertEqual(len(self.cache.set_many.call_args[0][0]), 3)
+
+    def test_cards_shared_between_feeds_and_users(self):
+        """Карточки с главной берёт лента группы у другого посетителя."""
+        self.guest_client.get('/')
+        self.cache.reset_mock()
+        response = Client().get(f'/group/{PostCardsTests.group.slug}/')
+        self.cache.get_many.assert_called_once()
+        self.cache.set_many.assert_not_called()
+        for post in PostCardsTests.posts:
+            with self.subTest(post=post.pk):
+                self.assertContains(response, post.text)
+
+    def test_edited_post_gets_new_card(self):
+        """Правка поста меняет ключ карточки и её содержимое."""
+        self.guest_client.get('/')
+        post = Post.objects.for_feed().get(pk=PostCardsTests.posts[0].pk)
+        old_key = card_key(post, show_author_link=True)
+        post.text = 'Изменённый текст'
+        with commit_hooks():
+            post.save()
+        post = Post.objects.for_feed().get(pk=post.pk)
+        self.assertNotEqual(card_key(post, show_author_link=True), old_key)
+        response = self.guest_client.get('/')
+        self.assertContains(response, 'Изменённый текст')
+
+    def test_ready_thumbnail_gets_new_card(self):
+        """Готовая миниатюра заменяет заглушку в закешированной карточке."""
+        post = make_image_post(PostCardsTests.user, text='Пост с картинкой')
+        response = self.guest_client.get('/')
+        self.assertContains(response, 'thumbnail_placeholder.svg')
+
+        with commit_hooks():
+            prepare_images(post.pk, post.image.name)
+        response = self.guest_client.get('/')
+        self.assertNotContains(response, 'thumbnail_placeholder.svg')
+        self.assertContains(response, get_ready_thumbnail(post.image).url)
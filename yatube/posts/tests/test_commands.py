@@ -0,0 +1,325 @@
+import json
+import os
+import tempfile
+import warnings
+from datetime import datetime, timedelta
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..models import Post, Group, User, Follow, Comment, Deletion, UserStats
+
+
+class ExplainFeedsCommandTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.author = User.objects.create_user(username='author')
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый пост',
+            group=cls.group
+        )
+        Comment.objects.create(
+            author=cls.user,
+            post=cls.post,
+            text='Тестовый комментарий'
+        )
+
+    def test_explain_feeds_uses_indexes(self):
+        """Запросы лент используют составные индексы."""
+        out = StringIO()
+        call_command(
+            'explain_feeds',
+            group=ExplainFeedsCommandTests.group.slug,
+            author=ExplainFeedsCommandTests.author.username,
+            user=ExplainFeedsCommandTests.user.username,
+            post=ExplainFeedsCommandTests.post.pk,
+            stdout=out
+        )
+        plan = out.getvalue()
+        for index in (
+            'post_pub_date_idx',
+            'post_group_pub_date_idx',
+            'post_author_pub_date_idx',
+            'comment_post_created_idx',
+        ):
+            with self.subTest(index=index):
+                self.assertIn(index, plan)
+
+    def test_explain_feeds_unknown_object(self):
+        """Несуществующий объект из аргумента — понятная ошибка команды."""
+        for option, value in (
+            ('group', 'missing'),
+            ('author', 'missing'),
+            ('user', 'missing'),
+            ('post', 10 ** 6),
+        ):
+            with self.subTest(option=option):
+                with self.assertRaisesMessage(CommandError, repr(value)):
+                    call_command(
+                        'explain_feeds', stdout=StringIO(), **{option: value}
+                    )
+
+
+class ImportContentCommandTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+        )
+
+    def run_import(self, content, suffix, **options):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            file.write(content)
+        out, err = StringIO(), StringIO()
+        call_command('import_content', path, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_jsonl(self):
+        """Посты, комментарии и подписки из JSONL попадают в базу."""
+        records = [
+            {'type': 'post', 'id': 500, 'author': 'author',
+             'group': 'test-slug', 'text': 'Архивный пост',
+             'pub_date': '2015-06-01T12:00:00+00:00'},
+            {'type': 'comment', 'post': 500, 'author': 'user',
+             'text': 'Архивный комментарий'},
+            {'type': 'follow', 'user': 'user', 'author': 'author'},
+        ]
+        out, err = self.run_import(
+            '\n'.join(json.dumps(record) for record in records), '.jsonl',
+            batch_size=2
+        )
+        post = Post.objects.get(pk=500)
+        self.assertEqual(post.group, ImportContentCommandTests.group)
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertEqual(post.comments_count, 1)
+        self.assertTrue(Follow.objects.filter(
+            user=ImportContentCommandTests.user,
+            author=ImportContentCommandTests.author
+        ).exists())
+        stats = UserStats.objects.get(user=ImportContentCommandTests.author)
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count), (1, 1)
+        )
+        self.assertEqual(err, '')
+        self.assertIn('строк/с', out)
+
+    def test_import_csv_reports_invalid_rows(self):
+        """Невалидные строки CSV пропускаются и попадают в отчёт."""
+        content = (
+            'author,group,text\n'
+            'author,,Первый пост\n'
+            'nobody,,Пост без автора\n'
+            'author,,\n'
+            'author,no-such-group,Пост без группы\n'
+        )
+        out, err = self.run_import(content, '.csv', kind='post')
+        self.assertEqual(
+            list(Post.objects.values_list('text', flat=True)),
+            ['Первый пост']
+        )
+        self.assertEqual(err.count('Строка'), 3)
+        self.assertIn('ошибок: 3', out)
+
+    def test_import_jsonl_reports_bad_ids_and_records(self):
+        """Неверный или занятый id и не-объект — ошибки своих строк."""
+        lines = [
+            json.dumps({'type': 'post', 'id': 700, 'author': 'author',
+                        'text': 'Первый', 'pub_date': '2016-01-01T00:00:00'}),
+            json.dumps({'type': 'post', 'id': 'x', 'author': 'author',
+                        'text': 'Второй'}),
+            json.dumps({'type': 'post', 'id': 700, 'author': 'author',
+                        'text': 'Третий'}),
+            json.dumps(['post']),
+            json.dumps({'type': 'comment', 'post': 700, 'author': 'user',
+                        'text': 'Комментарий',
+                        'created': '2016-01-02T00:00:00'}),
+        ]
+        out, err = self.run_import('\n'.join(lines), '.jsonl')
+        self.assertEqual(
+            list(Post.objects.values_list('pk', 'text')), [(700, 'Первый')]
+        )
+        post = Post.objects.get(pk=700)
+        self.assertEqual(post.pub_date.year, 2016)
+        self.assertEqual(post.comments.get().created.day, 2)
+        for number in (2, 3, 4):
+            with self.subTest(line=number):
+                self.assertIn(f'Строка {number}:', err)
+        self.assertIn('ошибок: 3', out)
+
+    @override_settings(TIME_ZONE='Europe/Moscow')
+    def test_import_naive_dates_in_site_timezone(self):
+        """Дата без часового пояса читается в поясе сайта."""
+        lines = [
+            json.dumps({'type': 'post', 'id': 800, 'author': 'author',
+                        'text': 'Пост', 'pub_date': '2016-01-01T12:00:00'}),
+            json.dumps({'type': 'comment', 'post': 800, 'author': 'user',
+                        'text': 'Комментарий',
+                        'created': '2016-01-02T12:00:00'}),
+        ]
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', RuntimeWarning)
+            self.run_import('\n'.join(lines), '.jsonl')
+        post = Post.objects.get(pk=800)
+        for date, expected in (
+            (post.pub_date, datetime(2016, 1, 1, 12)),
+            (post.comments.get().created, datetime(2016, 1, 2, 12)),
+        ):
+            with self.subTest(date=date):
+                self.assertEqual(date, timezone.make_aware(expected))
+
+
+class ExportContentTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый пост',
+            group=cls.group
+        )
+        Comment.objects.create(
+            author=cls.author,
+            post=cls.post,
+            text='Тестовый комментарий'
+        )
+
+    def test_export_jsonl(self):
+        """Пост выгружается вместе с автором, группой и комментариями."""
+        out = StringIO()
+        call_command('export_content', stdout=out)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(
+            [(record['type'], record['author']) for record in records],
+            [('post', 'author'), ('comment', 'author')]
+        )
+        self.assertEqual(records[0]['group'], 'test-slug')
+        self.assertEqual(records[1]['post'], ExportContentTests.post.pk)
+
+    def test_export_date_filter(self):
+        """Фильтр по pub_date отсекает посты вне периода."""
+        out = StringIO()
+        call_command('export_content', until='2000-01-01', stdout=out)
+        self.assertEqual(out.getvalue(), '')
+
+    def export_changes(self, **options):
+        out = StringIO()
+        call_command('export_content', stdout=out, **options)
+        return [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_changed_since(self):
+        """changed_since видит правку поста, но не старые строки."""
+        hour_ago = timezone.now() - timedelta(hours=1)
+        Post.objects.update(updated_at=hour_ago)
+        post = Post.objects.create(
+            author=ExportContentTests.author, text='Новый пост'
+        )
+        self.assertEqual(
+            list(Post.objects.changed_since(hour_ago)), [post]
+        )
+        ExportContentTests.post.text = 'Исправленный пост'
+        ExportContentTests.post.save()
+        self.assertEqual(
+            list(Post.objects.changed_since(hour_ago)),
+            [post, ExportContentTests.post]
+        )
+
+    def test_incremental_export_with_checkpoint(self):
+        """С контрольной точкой выгружаются только изменения и удаления."""
+        hour_ago = timezone.now() - timedelta(hours=1)
+        Post.objects.update(updated_at=hour_ago)
+        Comment.objects.update(updated_at=hour_ago)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        checkpoint = os.path.join(directory.name, 'checkpoint')
+
+        records = self.export_changes(checkpoint=checkpoint)
+        self.assertEqual(
+            [record['type'] for record in records], ['post', 'comment']
+        )
+        self.assertEqual(self.export_changes(checkpoint=checkpoint), [])
+
+        post = ExportContentTests.post
+        post.text = 'Исправленный пост'
+        post.save()
+        comment_id = post.comments.get().pk
+        post.comments.all().delete()
+        records = self.export_changes(checkpoint=checkpoint)
+        self.assertEqual(
+            [
+                (record['type'], record['id'], record.get('deleted'))
+                for record in records
+            ],
+            [('comment', comment_id, True), ('post', post.pk, None)]
+        )
+        self.assertEqual(records[1]['text'], 'Исправленный пост')
+
+        records = self.export_changes(changed_since=hour_ago.isoformat())
+        self.assertEqual(len(records), 2)
+
+    def test_recreated_post_follows_its_deletion(self):
+        """След удалённого поста идёт раньше записи, занявшей его id."""
+        hour_ago = timezone.now() - timedelta(hours=1)
+        last = Post.objects.create(
+            author=ExportContentTests.author, text='Последний пост'
+        )
+        pk = last.pk
+        last.delete()
+        Post.objects.create(
+            pk=pk, author=ExportContentTests.author, text='Новый пост'
+        )
+        records = [
+            (record['type'], record['id'], record.get('deleted'))
+            for record in self.export_changes(
+                changed_since=hour_ago.isoformat()
+            )
+            if record['id'] == pk and record['type'] == 'post'
+        ]
+        self.assertEqual(records, [('post', pk, True), ('post', pk, None)])
+
+    def test_prune_deletions_after_checkpoint(self):
+        """--prune убирает следы удалений, покрытые контрольной точкой."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        checkpoint = os.path.join(directory.name, 'checkpoint')
+        ExportContentTests.post.comments.all().delete()
+        Deletion.objects.update(
+            deleted_at=timezone.now() - timedelta(hours=1)
+        )
+        call_command(
+            'export_content', checkpoint=checkpoint, prune=True,
+            stdout=StringIO(), stderr=StringIO()
+        )
+        self.assertFalse(Deletion.objects.exists())
+
+    def test_export_view_staff_only(self):
+        """Выгрузка по HTTP доступна только персоналу и идёт потоком."""
+        url = '/export/'
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(ExportContentTests.staff)
+        response = self.client.get(url, {'format': 'csv'})
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        self.assertTrue(content.startswith('type,id,post,author'))
+        self.assertIn('Тестовый комментарий', content)
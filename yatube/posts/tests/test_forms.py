@@ -1,18 +1,12 @@
-import shutil
-import tempfile
-
-from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, Client, override_settings
+from django.test import TestCase, Client
 from django.urls import reverse
 
 from ..models import Post, Group, Comment, User
+from .utils import memory_media
 
 
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
-
-
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@memory_media()
 class PostCreateFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -38,11 +32,6 @@ class PostCreateFormTests(TestCase):
             slug='test-slug',
         )
 
-    @classmethod
-    def tearDownClass(cls):
-        super().tearDownClass()
-        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
-
     def setUp(self):
         self.not_authorized_client = Client()
         self.authorized_client = Client()
@@ -0,0 +1,179 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.storage import clear_volume
+
+from ..media import UPLOAD_TO, collect, store, walk
+from ..models import ImageBlob, Post, User
+from ..thumbnails import get_ready_thumbnail, prepare_images
+from .factories import OTHER_GIF, SMALL_GIF, make_image_post
+from .utils import memory_media
+
+
+@memory_media()
+class ContentAddressedMediaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+
+    def setUp(self):
+        clear_volume()
+
+    def create_post(self, name='small.gif', content=SMALL_GIF):
+        return make_image_post(ContentAddressedMediaTests.user, name, content)
+
+    def refs(self, name):
+        return ImageBlob.objects.get(name=name).refs
+
+    def test_same_content_stored_once(self):
+        """Одинаковые загрузки хранятся одним файлом под хешем."""
+        first = self.create_post('cat.gif')
+        second = self.create_post('copy_of_cat.GIF')
+        other = self.create_post('dog.gif', OTHER_GIF)
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertRegex(
+            first.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.gif$'
+        )
+        self.assertEqual(len(list(walk(UPLOAD_TO))), 2)
+        self.assertEqual(self.refs(first.image.name), 2)
+        self.assertEqual(self.refs(other.image.name), 1)
+        with second.image.open('rb') as image:
+            self.assertEqual(image.read(), SMALL_GIF)
+
+    def test_refs_follow_edits_and_deletes(self):
+        """Смена картинки и удаление поста уменьшают счётчик ссылок."""
+        post = self.create_post()
+        kept = self.create_post()
+        name = post.image.name
+
+        post.image = SimpleUploadedFile('dog.gif', OTHER_GIF)
+        post.save()
+        self.assertEqual(self.refs(name), 1)
+        self.assertEqual(self.refs(post.image.name), 1)
+
+        kept.delete()
+        self.assertEqual(self.refs(name), 0)
+
+    def test_unchanged_image_not_reread(self):
+        """Сохранение без смены картинки не перечитывает её из базы."""
+        post = Post.objects.get(pk=self.create_post().pk)
+        name = post.image.name
+        post.text = 'Изменённый пост'
+        with CaptureQueriesContext(connection) as context:
+            post.save()
+        for query in context.captured_queries:
+            self.assertNotIn('"posts_post"."image" FROM', query['sql'])
+        self.assertEqual(self.refs(name), 1)
+
+        other = self.create_post('dog.gif', OTHER_GIF).image.name
+        post.image = other
+        post.save()
+        self.assertEqual(self.refs(name), 0)
+        self.assertEqual(self.refs(other), 2)
+
+    def test_repost_reuses_variants(self):
+        """Картинка, которая уже обработана, не декодируется повторно."""
+        first = self.create_post()
+        prepare_images(first.pk, first.image.name)
+        first.refresh_from_db()
+
+        with mock.patch('posts.thumbnails.render_images') as render:
+            second = self.create_post('again.gif')
+        render.assert_not_called()
+        second.refresh_from_db()
+        self.assertEqual(second.image_variants, first.image_variants)
+
+    def test_collect_media_removes_orphans(self):
+        """collect_media удаляет файлы без ссылок и их миниатюры."""
+        kept = self.create_post()
+        dropped = self.create_post('dog.gif', OTHER_GIF)
+        prepare_images(dropped.pk, dropped.image.name)
+        thumbnail = get_ready_thumbnail(dropped.image)
+        self.assertTrue(default_storage.exists(thumbnail.name))
+        stray = default_storage.save('posts/stray.gif', ContentFile(b'x'))
+        name = dropped.image.name
+        dropped.delete()
+
+        output = StringIO()
+        call_command('collect_media', '--dry-run', grace=0, stdout=output)
+        self.assertIn(name, output.getvalue())
+        self.assertTrue(default_storage.exists(name))
+
+        call_command('collect_media', grace=0, stdout=StringIO())
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(default_storage.exists(stray))
+        self.assertFalse(default_storage.exists(thumbnail.name))
+        self.assertTrue(default_storage.exists(kept.image.name))
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+        self.assertEqual(self.refs(kept.image.name), 1)
+
+    def test_replaced_image_variants_collected(self):
+        """Варианты сменённой картинки сбрасываются и удаляются сборкой."""
+        post = self.create_post()
+        prepare_images(post.pk, post.image.name)
+        post.refresh_from_db()
+        old_files = [
+            name for variant in post.variants
+            for key, name in variant.items() if key in ('jpeg', 'webp')
+        ]
+        post.image = SimpleUploadedFile('dog.gif', OTHER_GIF)
+        post.save()
+        self.assertEqual(Post.objects.get(pk=post.pk).variants, [])
+        call_command('collect_media', grace=0, stdout=StringIO())
+        for name in old_files:
+            with self.subTest(name=name):
+                self.assertFalse(default_storage.exists(name))
+
+    def test_collect_skips_fresh_files(self):
+        """Свежий файл, на который пост ещё не сослался, не удаляется."""
+        name = store(SimpleUploadedFile('cat.gif', SMALL_GIF))
+        stray = default_storage.save('posts/stray.gif', ContentFile(b'x'))
+        self.assertEqual(collect(), [])
+        for kept in (name, stray):
+            with self.subTest(name=kept):
+                self.assertTrue(default_storage.exists(kept))
+        self.assertEqual(collect(grace=timedelta()), sorted([name, stray]))
+
+    def test_collect_rechecks_refs(self):
+        """Файл, на который сослались после выборки, остаётся."""
+        name = store(SimpleUploadedFile('cat.gif', SMALL_GIF))
+        original_filter = ImageBlob.objects.filter
+
+        def filter_after_retain(*args, **kwargs):
+            if 'claimed_at__lt' in kwargs and 'name' in kwargs:
+                Post.objects.create(
+                    author=ContentAddressedMediaTests.user,
+                    text='Пост с той же картинкой',
+                    image=name
+                )
+            return original_filter(*args, **kwargs)
+
+        with mock.patch.object(
+            ImageBlob.objects, 'filter', side_effect=filter_after_retain
+        ):
+            self.assertEqual(collect(grace=timedelta()), [])
+        self.assertEqual(self.refs(name), 1)
+        self.assertTrue(default_storage.exists(name))
+
+    def test_store_reads_upload_once(self):
+        """Загрузка читается один раз: и для хеша, и для записи."""
+        upload = SimpleUploadedFile('cat.gif', SMALL_GIF)
+        with mock.patch.object(
+            upload, 'chunks', wraps=upload.chunks
+        ) as chunks:
+            name = store(upload)
+        chunks.assert_called_once()
+        with default_storage.open(name) as file:
+            self.assertEqual(file.read(), SMALL_GIF)
@@ -0,0 +1,154 @@
+import os
+from unittest import mock
+
+from django.test import TestCase
+
+from .. import search
+from ..models import Comment, Post, User
+from ..search import SearchResults, search_ids
+from ..stemmer import stem
+from .utils import commit_hooks
+
+
+class StemmerTests(TestCase):
+    def test_word_forms_share_stem(self):
+        """Разные формы слова сводятся к одной основе."""
+        forms = {
+            'книга': 'книг',
+            'книгами': 'книг',
+            'важнейшими': 'важн',
+            'радость': 'радост',
+            'сделавшись': 'сдела',
+        }
+        for word, expected in forms.items():
+            with self.subTest(word=word):
+                self.assertEqual(stem(word), expected)
+
+    def test_matches_snowball_vocabulary(self):
+        """Основы совпадают с эталонным стеммером Snowball."""
+        path = os.path.join(os.path.dirname(__file__), 'stemmer_ru.txt')
+        with open(path, encoding='utf-8') as vocabulary:
+            for line in vocabulary:
+                if line.startswith('#'):
+                    continue
+                word, expected = line.split()
+                with self.subTest(word=word):
+                    self.assertEqual(stem(word), expected)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.post_books = Post.objects.create(
+            author=cls.user, text='Читаю интересные книги по вечерам'
+        )
+        cls.post_cats = Post.objects.create(
+            author=cls.user, text='Кошки спят весь день'
+        )
+
+    def test_search_by_word_form(self):
+        """Пост находится по другой форме слова."""
+        self.assertEqual(
+            search_ids('интересная книга'), [SearchTests.post_books.pk]
+        )
+
+    def test_post_text_ranks_above_comments(self):
+        """Совпадение в тексте поста важнее совпадения в комментарии."""
+        Comment.objects.create(
+            post=SearchTests.post_cats,
+            author=SearchTests.user,
+            text='Люблю книги'
+        )
+        self.assertEqual(
+            search_ids('книги'),
+            [SearchTests.post_books.pk, SearchTests.post_cats.pk]
+        )
+
+    def test_index_follows_changes(self):
+        """Правка и удаление поста отражаются в индексе."""
+        post = Post.objects.create(author=SearchTests.user, text='Собаки')
+        post.text = 'Попугаи'
+        post.save()
+        self.assertEqual(search_ids('собака'), [])
+        self.assertEqual(search_ids('попугай'), [post.pk])
+        post.delete()
+        self.assertEqual(search_ids('попугай'), [])
+
+    def test_bulk_created_posts_indexed(self):
+        """Посты из bulk_create тоже попадают в индекс."""
+        Post.objects.bulk_create(
+            Post(author=SearchTests.user, text='Черепаха номер ' + str(i))
+            for i in range(3)
+        )
+        self.assertCountEqual(
+            search_ids('черепахи'),
+            Post.objects.filter(
+                text__startswith='Черепаха'
+            ).values_list('pk', flat=True)
+        )
+
+    def test_search_page(self):
+        """Страница поиска выводит найденные посты и сохраняет запрос."""
+        response = self.client.get('/search/', {'q': 'кошка'})
+        self.assertEqual(
+            list(response.context['page_obj']), [SearchTests.post_cats]
+        )
+        self.assertEqual(response.context['query'], 'кошка')
+
+    def test_query_syntax_is_escaped(self):
+        """Спецсимволы FTS5 в запросе не ломают поиск."""
+        self.assertEqual(search_ids('"книги" OR NEAR('), [])
+
+    def test_new_comment_appended_without_reindex(self):
+        """Новый комментарий дописывается в индекс без пересборки поста."""
+        with mock.patch('posts.search._documents') as documents:
+            Comment.objects.create(
+                post=SearchTests.post_cats,
+                author=SearchTests.user,
+                text='Черепахи тоже спят'
+            )
+        documents.assert_not_called()
+        self.assertEqual(search_ids('черепаха'), [SearchTests.post_cats.pk])
+
+    def test_deleted_comment_leaves_index(self):
+        """Удалённый комментарий больше не находится."""
+        comment = Comment.objects.create(
+            post=SearchTests.post_cats,
+            author=SearchTests.user,
+            text='Попугаи'
+        )
+        with commit_hooks():
+            comment.delete()
+        self.assertEqual(search_ids('попугай'), [])
+        self.assertEqual(search_ids('кошки'), [SearchTests.post_cats.pk])
+
+    def test_deleted_post_not_reindexed_per_comment(self):
+        """Удаление поста с комментариями не пересобирает его документ."""
+        post = Post.objects.create(author=SearchTests.user, text='Попугаи')
+        Comment.objects.bulk_create(
+            Comment(post=post, author=SearchTests.user, text=str(i))
+            for i in range(5)
+        )
+        with mock.patch(
+            'posts.search._documents', wraps=search._documents
+        ) as documents:
+            with commit_hooks():
+                post.delete()
+        documents.assert_called_once()
+        self.assertEqual(search_ids('попугай'), [])
+
+    def test_results_not_truncated(self):
+        """Выдача пагинируется целиком, число совпадений точное."""
+        Post.objects.bulk_create(
+            Post(author=SearchTests.user, text='Черепаха номер ' + str(i))
+            for i in range(12)
+        )
+        results = SearchResults('черепаха')
+        self.assertEqual(results.count(), 12)
+        self.assertEqual(len(results[10:20]), 2)
+        self.assertEqual(results[0:12], search_ids('черепаха'))
+        response = self.client.get('/search/', {'q': 'черепаха', 'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 2)
+        self.assertEqual(response.context['page_obj'].paginator.count, 12)
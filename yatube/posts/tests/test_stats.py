@@ -0,0 +1,115 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Post, User, UserStats
+
+
+class UserStatsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.author = User.objects.create_user(username='author')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_stats_created_with_user(self):
+        """Строка статистики появляется вместе с пользователем."""
+        self.assertEqual(self.stats(UserStatsTests.user).posts_count, 0)
+
+    def test_posts_counted(self):
+        """Создание и удаление постов меняет счётчик, в том числе bulk."""
+        post = Post.objects.create(author=UserStatsTests.author, text='Пост')
+        Post.objects.bulk_create(
+            Post(author=UserStatsTests.author, text='Пост' + str(i))
+            for i in range(3)
+        )
+        self.assertEqual(self.stats(UserStatsTests.author).posts_count, 4)
+        post.delete()
+        self.assertEqual(self.stats(UserStatsTests.author).posts_count, 3)
+
+    def test_follows_counted(self):
+        """Подписка и отписка меняют счётчики обеих сторон."""
+        follow = Follow.objects.create(
+            user=UserStatsTests.user, author=UserStatsTests.author
+        )
+        self.assertEqual(self.stats(UserStatsTests.user).following_count, 1)
+        self.assertEqual(
+            self.stats(UserStatsTests.author).followers_count, 1
+        )
+        follow.delete()
+        self.assertEqual(self.stats(UserStatsTests.user).following_count, 0)
+        self.assertEqual(
+            self.stats(UserStatsTests.author).followers_count, 0
+        )
+
+    def test_comments_counted(self):
+        """Комментарий учитывается у автора и у поста."""
+        post = Post.objects.create(author=UserStatsTests.author, text='Пост')
+        Comment.objects.create(
+            post=post, author=UserStatsTests.user, text='Комментарий'
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(UserStatsTests.user).comments_count, 1)
+
+    def test_stale_post_save_keeps_comments_count(self):
+        """Сохранение устаревшего экземпляра поста не затирает счётчик."""
+        post = Post.objects.create(author=UserStatsTests.author, text='Пост')
+        Comment.objects.create(
+            post=post, author=UserStatsTests.user, text='Комментарий'
+        )
+        post.text = 'Исправленный пост'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.text, 'Исправленный пост')
+
+    def test_deferred_post_save_skips_unloaded_fields(self):
+        """Пост из only() сохраняется без дочитывания отложенных полей."""
+        post = Post.objects.create(author=UserStatsTests.author, text='Пост')
+        post = Post.objects.only('text', 'image').get(pk=post.pk)
+        post.text = 'Исправленный пост'
+        with mock.patch.object(
+            Post, 'refresh_from_db', autospec=True
+        ) as refresh:
+            post.save()
+        refresh.assert_not_called()
+        self.assertEqual(
+            Post.objects.get(pk=post.pk).text, 'Исправленный пост'
+        )
+
+    def test_reconcile_fixes_drift(self):
+        """reconcile_stats исправляет разошедшиеся и пропавшие счётчики."""
+        post = Post.objects.create(author=UserStatsTests.author, text='Пост')
+        Comment.objects.create(
+            post=post, author=UserStatsTests.user, text='Комментарий'
+        )
+        UserStats.objects.filter(user=UserStatsTests.author).update(
+            posts_count=10
+        )
+        UserStats.objects.filter(user=UserStatsTests.user).delete()
+        Post.objects.filter(pk=post.pk).update(comments_count=0)
+
+        call_command('reconcile_stats', stdout=StringIO())
+
+        self.assertEqual(self.stats(UserStatsTests.author).posts_count, 1)
+        self.assertEqual(self.stats(UserStatsTests.user).comments_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_profile_shows_stats(self):
+        """Профиль выводит числа из статистики, а не считает их заново."""
+        UserStats.objects.filter(user=UserStatsTests.author).update(
+            following_count=7, followers_count=42
+        )
+        response = self.client.get(
+            reverse('posts:profile', args=[UserStatsTests.author.username])
+        )
+        self.assertContains(response, 'Всего подписок: 7')
+        self.assertContains(response, 'Всего подписчиков: 42')
@@ -0,0 +1,147 @@
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, Client
+from PIL import Image
+
+from core.thumbnail_kvstore import CachedDBKVStore
+
+from ..models import Post, User
+from ..thumbnails import VARIANT_WIDTHS, get_ready_thumbnail, prepare_images
+from .factories import OTHER_GIF, SMALL_GIF, make_image_post
+from .utils import memory_media
+
+
+@memory_media()
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def create_post(self, name='small.gif', content=SMALL_GIF):
+        return make_image_post(ThumbnailTests.user, name, content)
+
+    def create_photo_post(self):
+        buffer = BytesIO()
+        Image.new('RGB', (1920, 1080), 'lightskyblue').save(buffer, 'PNG')
+        return self.create_post('photo.png', buffer.getvalue())
+
+    def test_placeholder_until_thumbnail_ready(self):
+        """Пока миниатюры нет, страницы показывают заглушку."""
+        post = self.create_post()
+        response = self.guest_client.get(f'/posts/{post.pk}/')
+        self.assertContains(response, 'thumbnail_placeholder.svg')
+
+        self.assertTrue(prepare_images(post.pk, post.image.name))
+        thumbnail = get_ready_thumbnail(post.image)
+        self.assertIsNotNone(thumbnail)
+        for url in ('/', f'/posts/{post.pk}/'):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, thumbnail.url)
+                self.assertNotContains(response, 'thumbnail_placeholder.svg')
+
+    def test_ready_thumbnail_survives_cache_clear(self):
+        """Метаданные миниатюры берутся из базы, если кеш их потерял."""
+        post = self.create_post()
+        prepare_images(post.pk, post.image.name)
+        url = get_ready_thumbnail(post.image).url
+        cache.clear()
+        response = self.guest_client.get('/')
+        self.assertContains(response, url)
+        self.assertNotContains(response, 'thumbnail_placeholder.svg')
+
+    def test_thumbnail_scheduled_when_image_changes(self):
+        """Миниатюра ставится в очередь только при смене картинки."""
+        with mock.patch('posts.signals.schedule_images') as schedule:
+            post = self.create_post()
+            schedule.assert_called_once_with(post)
+
+            schedule.reset_mock()
+            post.text = 'Изменённый пост'
+            post.save()
+            schedule.assert_not_called()
+
+            post.image = SimpleUploadedFile(
+                name='other.gif',
+                content=OTHER_GIF,
+                content_type='image/gif'
+            )
+            post.save()
+            schedule.assert_called_once_with(post)
+
+    def test_generate_variants(self):
+        """Все варианты в JPEG и WebP — за одно декодирование картинки."""
+        post = self.create_photo_post()
+        with mock.patch(
+            'posts.thumbnails.Image.open', wraps=Image.open
+        ) as image_open:
+            self.assertTrue(prepare_images(post.pk, post.image.name))
+        image_open.assert_called_once()
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(
+            post.variants[-1]['jpeg'], get_ready_thumbnail(post.image).name
+        )
+        self.assertEqual(
+            [variant['width'] for variant in post.variants],
+            sorted(VARIANT_WIDTHS)
+        )
+        for variant in post.variants:
+            for extension in ('jpeg', 'webp'):
+                with self.subTest(width=variant['width'], format=extension):
+                    with Image.open(
+                        post.image.storage.open(variant[extension])
+                    ) as image:
+                        self.assertEqual(image.format, extension.upper())
+                        self.assertEqual(
+                            image.size, (variant['width'], variant['height'])
+                        )
+
+    def test_srcset_rendered(self):
+        """Страницы отдают srcset с вариантами картинки."""
+        post = self.create_photo_post()
+        prepare_images(post.pk, post.image.name)
+        post = Post.objects.get(pk=post.pk)
+        for url in ('/', f'/posts/{post.pk}/'):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, post.webp_srcset)
+                self.assertContains(response, post.jpeg_srcset)
+
+    def test_feed_image_bytes_benchmark(self):
+        """Бенчмарк показывает экономию трафика на мобильном клиенте."""
+        post = self.create_photo_post()
+        prepare_images(post.pk, post.image.name)
+        out = StringIO()
+        call_command('feed_image_bytes', pages=1, stdout=out)
+        self.assertIn('экономия', out.getvalue())
+        self.assertNotIn('экономия 0%', out.getvalue())
+
+    def test_feed_thumbnails_fetched_in_one_batch(self):
+        """Миниатюры страницы ленты читаются одним get_many."""
+        posts = [self.create_post(f'small{i}.gif') for i in range(3)]
+        for post in posts:
+            prepare_images(post.pk, post.image.name)
+        with mock.patch.object(
+            CachedDBKVStore, 'get_many', autospec=True,
+            side_effect=CachedDBKVStore.get_many
+        ) as get_many, mock.patch.object(
+            CachedDBKVStore, '_get_raw', autospec=True,
+            side_effect=CachedDBKVStore._get_raw
+        ) as get_raw:
+            response = self.guest_client.get('/')
+        get_many.assert_called_once()
+        get_raw.assert_not_called()
+        for post in posts:
+            with self.subTest(post=post.pk):
+                self.assertContains(
+                    response, get_ready_thumbnail(post.image).url
+                )
@@ -0,0 +1,130 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import Post, User, Follow, TimelineEntry
+from ..timeline import get_timeline
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый пост',
+        )
+
+    def timeline_ids(self):
+        return set(
+            get_timeline(TimelineTests.user).values_list('pk', flat=True)
+        )
+
+    def test_follow_backfills_timeline(self):
+        """Подписка переносит в ленту уже написанные посты автора."""
+        Follow.objects.create(
+            user=TimelineTests.user, author=TimelineTests.author
+        )
+        self.assertEqual(self.timeline_ids(), {TimelineTests.post.pk})
+
+    def test_new_post_fans_out(self):
+        """Новый пост попадает в ленты подписчиков."""
+        Follow.objects.create(
+            user=TimelineTests.user, author=TimelineTests.author
+        )
+        post = Post.objects.create(
+            author=TimelineTests.author, text='Новый пост'
+        )
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=TimelineTests.user, post=post
+            ).exists()
+        )
+
+    def test_bulk_created_posts_fan_out(self):
+        """Посты из bulk_create тоже попадают в ленты."""
+        Follow.objects.create(
+            user=TimelineTests.user, author=TimelineTests.author
+        )
+        Post.objects.bulk_create(
+            Post(author=TimelineTests.author, text='Пост' + str(i))
+            for i in range(3)
+        )
+        self.assertEqual(len(self.timeline_ids()), 4)
+
+    def test_unfollow_clears_timeline(self):
+        """Отписка убирает посты автора из ленты."""
+        Follow.objects.create(
+            user=TimelineTests.user, author=TimelineTests.author
+        )
+        Follow.objects.filter(
+            user=TimelineTests.user, author=TimelineTests.author
+        ).delete()
+        self.assertEqual(self.timeline_ids(), set())
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_fanout_on_read_author(self):
+        """Посты популярных авторов подмешиваются в ленту при чтении."""
+        with mock.patch('posts.timeline.FANOUT_FOLLOWERS_LIMIT', 0):
+            Follow.objects.create(
+                user=TimelineTests.user, author=TimelineTests.author
+            )
+            post = Post.objects.create(
+                author=TimelineTests.author, text='Новый пост'
+            )
+            self.assertFalse(TimelineEntry.objects.exists())
+            self.assertEqual(
+                self.timeline_ids(), {TimelineTests.post.pk, post.pk}
+            )
+
+    def test_rebuild_timelines(self):
+        """Команда rebuild_timelines восстанавливает ленты."""
+        Follow.objects.create(
+            user=TimelineTests.user, author=TimelineTests.author
+        )
+        TimelineEntry.objects.all().delete()
+        call_command(
+            'rebuild_timelines',
+            TimelineTests.user.username,
+            stdout=StringIO()
+        )
+        self.assertEqual(self.timeline_ids(), {TimelineTests.post.pk})
+
+    def test_bulk_create_fans_out_only_new_posts(self):
+        """bulk_create раскладывает только новые посты, старые не трогает."""
+        Follow.objects.create(
+            user=TimelineTests.user, author=TimelineTests.author
+        )
+        TimelineEntry.objects.all().delete()
+        Post.objects.bulk_create(
+            Post(author=TimelineTests.author, text='Пост' + str(i))
+            for i in range(2)
+        )
+        self.assertEqual(TimelineEntry.objects.count(), 2)
+        self.assertNotIn(TimelineTests.post.pk, self.timeline_ids())
+
+    def test_author_back_under_limit_is_backfilled(self):
+        """Посты, написанные сверх порога, остаются в ленте после отписок."""
+        other = User.objects.create_user(username='other')
+        with mock.patch('posts.timeline.FANOUT_FOLLOWERS_LIMIT', 1):
+            Follow.objects.create(
+                user=TimelineTests.user, author=TimelineTests.author
+            )
+            Follow.objects.create(user=other, author=TimelineTests.author)
+            post = Post.objects.create(
+                author=TimelineTests.author, text='Новый пост'
+            )
+            self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+            Follow.objects.filter(user=other).delete()
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=TimelineTests.user, post=post
+            ).exists()
+        )
+        self.assertEqual(
+            self.timeline_ids(), {TimelineTests.post.pk, post.pk}
+        )
@@ -1,20 +1,31 @@
-import shutil
-import tempfile
+import base64
+import json
+
+from unittest import mock
 
-from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, Client, override_settings
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
 from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core.routers import ReplicaState
 
+from ..caching import FEED_GENERATION_KEY, get_feed_generation
 from ..models import Post, Group, User, Follow, Comment
 from ..forms import PostForm
-from ..utils import POSTS_ON_PAGE
-
-
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+from ..utils import COMMENTS_ON_PAGE, POSTS_ON_PAGE, encode_cursor
+from .factories import (
+    make_comments, make_follows, make_groups, make_posts, make_users
+)
+from .utils import (
+    commit_hooks, count_queries, memory_media, query_problems
+)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@memory_media()
 class PostsURLTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -115,11 +126,6 @@ class PostsURLTests(TestCase):
             (cls.url_follow_index, 'posts/follow.html')
         ]
 
-    @classmethod
-    def tearDownClass(cls):
-        super().tearDownClass()
-        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
-
     def setUp(self):
         cache.clear()
 
@@ -184,7 +190,9 @@ class PostsURLTests(TestCase):
         for url in PostsURLTests.pages_with_paginator:
             for page, posts in page_posts:
                 with self.subTest(url=url):
-                    response = self.user_follower.get(url, {'page': page})
+                    response = self.user_follower.get(
+                        url, {'page': page}, follow=True
+                    )
                     posts_on_page = len(response.context['page_obj'])
                     self.assertEqual(posts_on_page, posts)
                     cache.clear()
@@ -195,16 +203,42 @@ class PostsURLTests(TestCase):
 
         obj_before_del = response.context['page_obj'][0]
         content_before_del = response.content
-        Post.objects.filter(id=obj_before_del.id).delete()
+        Post.objects.filter(id=obj_before_del.id).update(text='Изменённый')
 
         response = self.authorized_client.get(PostsURLTests.url_index)
-        content_after_del = response.content
-        self.assertEqual(content_after_del, content_before_del)
+        self.assertEqual(response.content, content_before_del)
 
-        cache.clear()
+        with commit_hooks():
+            Post.objects.filter(id=obj_before_del.id).delete()
         response = self.authorized_client.get(PostsURLTests.url_index)
-        obj_after_del_cache_clear = response.context['page_obj'][0]
-        self.assertNotEqual(obj_before_del, obj_after_del_cache_clear)
+        obj_after_del = response.context['page_obj'][0]
+        self.assertNotEqual(obj_before_del, obj_after_del)
+
+    def test_cache_invalidated_on_group_change(self):
+        """Изменение группы сбрасывает кеш страниц лент."""
+        self.guest_client.get(PostsURLTests.url_group_list)
+        group = Group.objects.get(pk=PostsURLTests.group.pk)
+        group.description = 'Новое описание группы'
+        with commit_hooks():
+            group.save()
+        response = self.guest_client.get(PostsURLTests.url_group_list)
+        self.assertContains(response, 'Новое описание группы')
+
+    def test_generation_bumped_after_commit(self):
+        """Поколение лент меняется только после фиксации транзакции."""
+        generation = get_feed_generation()
+        with commit_hooks():
+            with transaction.atomic():
+                Group.objects.create(title='Новая группа', slug='new-slug')
+                self.assertEqual(get_feed_generation(), generation)
+        self.assertGreater(get_feed_generation(), generation)
+
+    def test_evicted_generation_not_reused(self):
+        """Вытесненный счётчик не начинается заново с пройденных чисел."""
+        cache.set(FEED_GENERATION_KEY, 10 ** 15, None)
+        generation = get_feed_generation()
+        cache.delete(FEED_GENERATION_KEY)
+        self.assertGreater(get_feed_generation(), generation)
 
     def test_following(self):
         """Тестирование подписок и отписок."""
@@ -239,7 +273,8 @@ class PostsURLTests(TestCase):
         for page, posts in page_posts:
             with self.subTest(page=page):
                 response = self.user_follower.get(
-                    PostsURLTests.url_follow_index, {'page': page}
+                    PostsURLTests.url_follow_index, {'page': page},
+                    follow=True
                 )
                 posts_on_page = len(response.context['page_obj'])
                 self.assertEqual(posts_on_page, posts)
@@ -286,3 +321,402 @@ class PostsURLTests(TestCase):
         )
 
         self.assertNotEqual(Comment.objects.count(), comments_count + 1)
+
+
+class FeedQueriesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.user = User.objects.create_user(username='user')
+        cls.follower = User.objects.create_user(username='follower')
+        Follow.objects.create(user=cls.follower, author=cls.user)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+        )
+        Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            group=cls.group
+        )
+
+        cls.feed_urls = (
+            '/',
+            f'/group/{cls.group.slug}/',
+            f'/profile/{cls.user}/',
+            '/follow/',
+        )
+
+    def setUp(self):
+        self.follower_client = Client()
+        self.follower_client.force_login(FeedQueriesTests.follower)
+
+    def test_feed_queries_do_not_depend_on_page_size(self):
+        """Число запросов ленты не растёт вместе с числом постов."""
+        queries_before = {
+            url: count_queries(self.follower_client, url)
+            for url in FeedQueriesTests.feed_urls
+        }
+        authors = make_users(
+            POSTS_ON_PAGE, prefix='author',
+            first_name='Имя', last_name='Фамилия'
+        )
+        make_follows(FeedQueriesTests.follower, authors)
+        make_posts(
+            authors, POSTS_ON_PAGE, groups=make_groups(POSTS_ON_PAGE)
+        )
+        make_posts(
+            [FeedQueriesTests.user], POSTS_ON_PAGE,
+            groups=[FeedQueriesTests.group]
+        )
+
+        for url in FeedQueriesTests.feed_urls:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    count_queries(self.follower_client, url),
+                    queries_before[url]
+                )
+
+    def test_feed_queries_within_budget(self):
+        """Страницы укладываются в бюджет запросов и не делают N+1."""
+        authors = make_users(POSTS_ON_PAGE, prefix='author')
+        make_follows(FeedQueriesTests.follower, authors)
+        posts = make_posts(
+            authors, POSTS_ON_PAGE, groups=[FeedQueriesTests.group]
+        )
+        for post in posts:
+            make_comments(post, [FeedQueriesTests.follower, post.author], 2)
+
+        for url in FeedQueriesTests.feed_urls + (f'/posts/{post.pk}/',):
+            with self.subTest(url=url):
+                problems = query_problems(self.follower_client, url)
+                if problems:
+                    self.fail('\n'.join(problems))
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.user = User.objects.create_user(username='user')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text='Тестовый пост' + str(i))
+            for i in range(POSTS_ON_PAGE * 2 + 5)
+        )
+        cls.expected_ids = list(
+            Post.objects.order_by('-pub_date', '-pk').values_list(
+                'pk', flat=True
+            )
+        )
+        cls.url_index = '/'
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_cursor_walks_whole_feed(self):
+        """Переход по курсорам проходит ленту без пропусков и повторов."""
+        response = self.guest_client.get(CursorPaginationTests.url_index)
+        page_obj = response.context['page_obj']
+        ids = [post.pk for post in page_obj]
+        while page_obj.has_next():
+            response = self.guest_client.get(
+                CursorPaginationTests.url_index,
+                {'cursor': page_obj.next_cursor}
+            )
+            page_obj = response.context['page_obj']
+            ids += [post.pk for post in page_obj]
+        self.assertEqual(ids, CursorPaginationTests.expected_ids)
+
+    def test_cursor_previous_page(self):
+        """Курсор «назад» возвращает на предыдущую страницу."""
+        first_page = self.guest_client.get(
+            CursorPaginationTests.url_index
+        ).context['page_obj']
+        second_page = self.guest_client.get(
+            CursorPaginationTests.url_index,
+            {'cursor': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertTrue(second_page.has_previous())
+        previous_page = self.guest_client.get(
+            CursorPaginationTests.url_index,
+            {'cursor': second_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(previous_page), list(first_page))
+        self.assertFalse(previous_page.has_previous())
+
+    def test_cursor_does_not_count(self):
+        """Страница по курсору не выполняет COUNT."""
+        with CaptureQueriesContext(connection) as context:
+            self.guest_client.get(
+                CursorPaginationTests.url_index,
+                {'cursor': encode_cursor(Post.objects.earliest('pk'))}
+            )
+        for query in context.captured_queries:
+            self.assertNotIn('COUNT', query['sql'])
+
+    def test_first_page_does_not_count(self):
+        """Первая страница ленты обходится без COUNT и OFFSET."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.guest_client.get(CursorPaginationTests.url_index)
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            CursorPaginationTests.expected_ids[:POSTS_ON_PAGE]
+        )
+        for query in context.captured_queries:
+            self.assertNotIn('COUNT', query['sql'])
+            self.assertNotIn('OFFSET', query['sql'])
+
+    def test_legacy_page_redirects_to_cursor(self):
+        """Старая ссылка ?page=N переадресует на курсор той же страницы."""
+        response = self.guest_client.get(
+            CursorPaginationTests.url_index, {'page': 3}
+        )
+        last = Post.objects.get(
+            pk=CursorPaginationTests.expected_ids[POSTS_ON_PAGE * 2 - 1]
+        )
+        self.assertRedirects(
+            response,
+            f'{CursorPaginationTests.url_index}?cursor={encode_cursor(last)}',
+            status_code=301
+        )
+        for page in (1, 100, 'last'):
+            with self.subTest(page=page):
+                response = self.guest_client.get(
+                    CursorPaginationTests.url_index, {'page': page}
+                )
+                self.assertRedirects(
+                    response, CursorPaginationTests.url_index,
+                    status_code=301
+                )
+
+    def test_profile_shows_approximate_count(self):
+        """Профиль показывает приближённое число записей автора."""
+        response = self.guest_client.get(
+            f'/profile/{CursorPaginationTests.user.username}/'
+        )
+        self.assertEqual(
+            response.context['page_obj'].paginator.count,
+            len(CursorPaginationTests.expected_ids)
+        )
+        self.assertContains(
+            response,
+            f'Записей: около {len(CursorPaginationTests.expected_ids)}'
+        )
+
+    def test_broken_cursor_returns_first_page(self):
+        """
+        Испорченный курсор, id вне диапазона или дата без часового пояса —
+        первая страница.
+        """
+        for cursor in ('broken', *(
+            base64.urlsafe_b64encode(json.dumps(
+                ['2021-01-01T00:00:00+00:00', pk, False]
+            ).encode()).decode()
+            for pk in (2 ** 63, -1, 10 ** 30)
+        ), base64.urlsafe_b64encode(json.dumps(
+            ['2021-01-01T00:00:00', 1, False]
+        ).encode()).decode()):
+            with self.subTest(cursor=cursor):
+                response = self.guest_client.get(
+                    CursorPaginationTests.url_index, {'cursor': cursor}
+                )
+                self.assertEqual(
+                    [post.pk for post in response.context['page_obj']],
+                    CursorPaginationTests.expected_ids[:POSTS_ON_PAGE]
+                )
+
+
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.user = User.objects.create_user(username='user')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        Comment.objects.bulk_create(
+            Comment(
+                post=cls.post, author=cls.user, text='Комментарий' + str(i)
+            )
+            for i in range(COMMENTS_ON_PAGE + 5)
+        )
+        cls.url_post_detail = f'/posts/{cls.post.pk}/'
+        cls.url_comments = f'/posts/{cls.post.pk}/comments/'
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_post_detail_limits_comments(self):
+        """На странице поста не больше COMMENTS_ON_PAGE комментариев."""
+        response = self.guest_client.get(
+            CommentPaginationTests.url_post_detail
+        )
+        self.assertEqual(len(response.context['comments']), COMMENTS_ON_PAGE)
+        self.assertIsNotNone(response.context['comments_cursor'])
+
+    def test_comments_queries_do_not_grow(self):
+        """Авторы комментариев подгружаются одним запросом."""
+        with CaptureQueriesContext(connection) as context:
+            self.guest_client.get(CommentPaginationTests.url_post_detail)
+        self.assertLessEqual(len(context.captured_queries), 5)
+
+    def test_comments_endpoint_returns_rest(self):
+        """Эндпоинт по курсору отдаёт оставшиеся комментарии фрагментом."""
+        cursor = self.guest_client.get(
+            CommentPaginationTests.url_post_detail
+        ).context['comments_cursor']
+        data = self.guest_client.get(
+            CommentPaginationTests.url_comments, {'cursor': cursor}
+        ).json()
+        self.assertIsNone(data['next_cursor'])
+        self.assertEqual(data['html'].count('media-body'), 5)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.user = User.objects.create_user(username='user')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Тестовый пост'
+        )
+        cls.urls = (
+            '/',
+            f'/group/{cls.group.slug}/',
+            f'/profile/{cls.user.username}/',
+            f'/posts/{cls.post.pk}/',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(ConditionalGetTests.user)
+
+    def test_not_modified_without_rendering(self):
+        """Повторный запрос с валидаторами получает 304 без шаблонов."""
+        for url in ConditionalGetTests.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.has_header('Last-Modified'))
+                for headers in (
+                    {'HTTP_IF_NONE_MATCH': response['ETag']},
+                    {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']},
+                ):
+                    repeat = self.guest_client.get(url, **headers)
+                    self.assertEqual(repeat.status_code, 304)
+                    self.assertEqual(repeat.content, b'')
+                    self.assertEqual(repeat.templates, [])
+
+    def test_not_modified_queries(self):
+        """304 ленты обходится без SQL, 304 поста — одним запросом."""
+        for url, queries in zip(ConditionalGetTests.urls, (0, 0, 0, 1)):
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                with self.assertNumQueries(queries):
+                    self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_etag_varies_on_user(self):
+        """У авторизованного пользователя свой ETag."""
+        for url in ConditionalGetTests.urls:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                response = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_relogin_changes_etag(self):
+        """После повторного входа страница не отдаётся из кеша браузера."""
+        User.objects.create_user(username='reader', password='password')
+        credentials = {'username': 'reader', 'password': 'password'}
+        url = f'/posts/{ConditionalGetTests.post.pk}/'
+        self.guest_client.post('/auth/login/', credentials)
+        response = self.guest_client.get(url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        etag = response['ETag']
+        self.guest_client.post('/auth/logout/')
+        self.guest_client.post('/auth/login/', credentials)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_changes_invalidate_validators(self):
+        """Правка поста и новый комментарий меняют ETag."""
+        etags = {
+            url: self.guest_client.get(url)['ETag']
+            for url in ConditionalGetTests.urls
+        }
+        post = ConditionalGetTests.post
+        post.text = 'Изменённый пост'
+        with commit_hooks():
+            post.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+        url = f'/posts/{post.pk}/'
+        etag = self.guest_client.get(url)['ETag']
+        Comment.objects.create(
+            post=post, author=ConditionalGetTests.user, text='Комментарий'
+        )
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Комментарий')
+
+    def test_missing_pages_have_no_validators(self):
+        """404 не получает валидаторов и не превращается в 304."""
+        for url in ('/group/missing/', '/profile/missing/', '/posts/0/'):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertFalse(response.has_header('ETag'))
+                self.assertFalse(response.has_header('Last-Modified'))
+        response = self.guest_client.get('/posts/0/', HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
+
+
+def read_replica_as_default(state, replicas):
+    """Запоминает реплику, но читает из тестовой базы."""
+    state.replica = replicas[0]
+    return 'default'
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+@mock.patch.object(ReplicaState, 'choose_replica', read_replica_as_default)
+class ReplicaPagesTests(TransactionTestCase):
+    # Внутри транзакции TestCase роутер всегда читает с основной базы.
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='user')
+        Post.objects.create(author=self.user, text='Тестовый пост')
+        cache.clear()
+
+    def test_replica_pages_not_cached_or_validated(self):
+        """Страница с реплики не кешируется и не получает валидаторов."""
+        for url in ('/', f'/profile/{self.user.username}/'):
+            with self.subTest(url=url):
+                self.client.get(url)
+                response = self.client.get(url)
+                self.assertNotEqual(response.templates, [])
+                self.assertFalse(response.has_header('ETag'))
+                self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_pinned_pages_cached(self):
+        """После записи чтение с основной базы снова кешируется."""
+        self.client.cookies['replica_pin'] = '1'
+        self.client.get('/')
+        response = self.client.get('/')
+        self.assertEqual(response.templates, [])
+        self.assertTrue(response.has_header('ETag'))
@@ -0,0 +1,107 @@
+import re
+from collections import Counter
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+
+
+# Бюджеты SQL-запросов на холодном кеше для авторизованного пользователя:
+# сессия и пользователь (2) плюс запросы самой страницы. У post_detail
+# ещё один запрос — валидаторы ETag/Last-Modified (posts.conditional).
+QUERY_BUDGETS = {
+    'posts:index': 4,
+    'posts:group_list': 5,
+    'posts:profile': 6,
+    'posts:post_detail': 5,
+    'posts:follow_index': 4,
+}
+
+MEMORY_STORAGE = 'core.storage.MemoryStorage'
+
+
+def memory_media():
+    """Медиа в памяти: файлы не попадают на диск и выбрасываются после."""
+    return override_settings(
+        DEFAULT_FILE_STORAGE=MEMORY_STORAGE,
+        THUMBNAIL_STORAGE=MEMORY_STORAGE,
+    )
+
+
+@contextmanager
+def commit_hooks():
+    """
+    Выполняет on_commit-обработчики, добавленные внутри блока. TestCase
+    не фиксирует транзакцию, а captureOnCommitCallbacks в Django 2.2 нет.
+    """
+    start = len(connection.run_on_commit)
+    yield
+    hooks = connection.run_on_commit[start:]
+    del connection.run_on_commit[start:]
+    for _, hook in hooks:
+        hook()
+
+
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def sql_shape(sql):
+    """Форма запроса: SQL без параметров, списки IN сжаты до одного."""
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+class QueryRecorder:
+    """Записывает SQL-запросы соединения вместе с параметрами."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    def duplicates(self):
+        """Формы запросов, выполненные больше одного раза (признак N+1)."""
+        shapes = Counter(sql_shape(sql) for sql, _ in self.queries)
+        return {shape: count for shape, count in shapes.items() if count > 1}
+
+
+def query_problems(client, url, data=None, budget=None):
+    """
+    Запрашивает страницу на холодном кеше и возвращает список нарушений:
+    превышение бюджета представления и повторяющиеся формы запросов.
+    """
+    cache.clear()
+    with QueryRecorder() as recorder:
+        response = client.get(url, data)
+    view_name = response.resolver_match.view_name
+    if budget is None:
+        budget = QUERY_BUDGETS.get(view_name)
+
+    problems = []
+    if budget is not None and len(recorder.queries) > budget:
+        problems.append(
+            f'{view_name}: {len(recorder.queries)} запросов '
+            f'при бюджете {budget}:\n'
+            + '\n'.join(sql for sql, _ in recorder.queries)
+        )
+    for shape, count in recorder.duplicates().items():
+        problems.append(f'{view_name}: запрос повторён {count} раз: {shape}')
+    return problems
+
+
+def count_queries(client, url, data=None):
+    """Количество SQL-запросов, которое тратит страница на один ответ."""
+    cache.clear()
+    with QueryRecorder() as recorder:
+        client.get(url, data)
+    return len(recorder.queries)
@@ -0,0 +1,240 @@
+"""
+Фоновая подготовка миниатюр картинок постов.
+
+Шаблоны не создают миниатюры сами: они берут готовую из хранилища
+sorl-thumbnail, а пока её нет, показывают заглушку. Миниатюру и набор
+адаптивных вариантов (несколько ширин в JPEG и WebP) строит пул потоков
+после сохранения поста, а для уже существующих постов — команда
+warm_thumbnails. Картинка декодируется один раз: кадр наибольшей ширины
+записывается как миниатюра sorl и служит JPEG-вариантом этой ширины.
+"""
+import io
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, features
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from .caching import bump_feed_generation
+from .models import Post
+
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_GEOMETRY = '960x339'
+
+THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+
+VARIANT_WIDTHS = (320, 640, 960)
+
+VARIANT_QUALITY = 80
+
+VARIANT_FORMATS = [('jpeg', 'JPEG')]
+if features.check('webp'):
+    VARIANT_FORMATS.append(('webp', 'WEBP'))
+
+
+class ReadyThumbnailBackend(ThumbnailBackend):
+    def _thumbnail_file(self, file_, geometry_string, options):
+        """Файл миниатюры, который создал бы get_thumbnail; без IO."""
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def save_thumbnail(self, file_, source_size, image, geometry_string,
+                       **options):
+        """
+        Записывает готовый кадр PIL как миниатюру, которую создал бы
+        get_thumbnail: то же имя файла и те же записи метаданных.
+        """
+        source = ImageFile(file_)
+        source.set_size(source_size)
+        thumbnail = self._thumbnail_file(file_, geometry_string, options)
+        # Как и get_thumbnail, существующий файл не перезаписываем:
+        # хранилище сохранило бы копию под другим именем.
+        if not thumbnail.exists():
+            default.engine.write(image, options, thumbnail)
+        thumbnail.set_size(image.size)
+        default.kvstore.get_or_set(source)
+        default.kvstore.set(thumbnail, source)
+        return thumbnail
+
+    def get_ready_thumbnails(self, files, geometry_string, **options):
+        """Как get_thumbnail, но без создания: только готовые миниатюры."""
+        thumbnails = [
+            self._thumbnail_file(file_, geometry_string, dict(options))
+            for file_ in files
+        ]
+        if hasattr(default.kvstore, 'get_many'):
+            return default.kvstore.get_many(thumbnails)
+        return [default.kvstore.get(thumbnail) for thumbnail in thumbnails]
+
+
+backend = ReadyThumbnailBackend()
+
+_executor = None
+
+
+def get_ready_thumbnail(image):
+    if not image:
+        return None
+    if hasattr(image, '_ready_thumbnail'):
+        return image._ready_thumbnail
+    return backend.get_ready_thumbnails(
+        [image], THUMBNAIL_GEOMETRY, **THUMBNAIL_OPTIONS
+    )[0]
+
+
+def prefetch_ready_thumbnails(posts):
+    """Готовые миниатюры целой страницы постов за одно обращение к кешу."""
+    images = [post.image for post in posts if post.image]
+    thumbnails = backend.get_ready_thumbnails(
+        images, THUMBNAIL_GEOMETRY, **THUMBNAIL_OPTIONS
+    )
+    for image, thumbnail in zip(images, thumbnails):
+        image._ready_thumbnail = thumbnail
+
+
+def render_images(image_file):
+    """
+    Всё для картинки за одно декодирование: исходный размер, кадр
+    миниатюры наибольшей ширины и варианты (ширина, высота, расширение,
+    байты). Меньшие ширины получаются из готового кадра, а JPEG
+    наибольшей ширины не кодируется — это сама миниатюра.
+    """
+    with Image.open(image_file) as source:
+        source_size = source.size
+        source = ImageOps.exif_transpose(source).convert('RGB')
+    width, height = THUMBNAIL_GEOMETRY.split('x')
+    ratio = int(height) / int(width)
+    master = ImageOps.fit(
+        source,
+        (max(VARIANT_WIDTHS), round(max(VARIANT_WIDTHS) * ratio)),
+        method=Image.LANCZOS
+    )
+    variants = []
+    for width in sorted(VARIANT_WIDTHS, reverse=True):
+        size = (width, round(width * ratio))
+        frame = master if master.size == size else master.resize(
+            size, Image.LANCZOS
+        )
+        for extension, image_format in VARIANT_FORMATS:
+            if frame is master and extension == 'jpeg':
+                continue
+            buffer = io.BytesIO()
+            frame.save(buffer, image_format, quality=VARIANT_QUALITY)
+            variants.append((width, size[1], extension, buffer.getvalue()))
+    return source_size, master, variants
+
+
+def prepare_images(post_id, image_name):
+    """Миниатюра и варианты картинки, если пост её ещё не сменил."""
+    try:
+        with default_storage.open(image_name, 'rb') as image_file:
+            source_size, master, rendered = render_images(image_file)
+        thumbnail = backend.save_thumbnail(
+            image_name, source_size, master,
+            THUMBNAIL_GEOMETRY, **THUMBNAIL_OPTIONS
+        )
+        variants = {
+            master.width: {
+                'width': master.width,
+                'height': master.height,
+                'jpeg': thumbnail.name,
+                'jpeg_bytes': thumbnail.storage.size(thumbnail.name),
+            }
+        }
+        stem = os.path.splitext(os.path.basename(image_name))[0]
+        for width, height, extension, data in rendered:
+            name = default_storage.save(
+                f'posts/variants/{stem}_{width}.{extension}',
+                ContentFile(data)
+            )
+            variant = variants.setdefault(
+                width, {'width': width, 'height': height}
+            )
+            variant[extension] = name
+            variant[extension + '_bytes'] = len(data)
+        Post.objects.filter(pk=post_id, image=image_name).update(
+            image_variants=json.dumps(sorted(
+                variants.values(), key=lambda variant: variant['width']
+            ))
+        )
+        # Страницы с заглушкой вместо миниатюры больше не годятся.
+        bump_feed_generation()
+    except Exception:
+        logger.exception('Не удалось обработать картинку %s', image_name)
+        return False
+    finally:
+        close_old_connections()
+    return True
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails'
+        )
+    return _executor
+
+
+def reuse_variants(post_id, image_name):
+    """
+    Та же картинка у другого поста уже обработана: миниатюра у них
+    общая, а варианты копируются без повторного декодирования.
+    """
+    variants = Post.objects.filter(image=image_name).exclude(
+        pk=post_id
+    ).exclude(image_variants='').values_list(
+        'image_variants', flat=True
+    ).first()
+    if variants is None:
+        return False
+    Post.objects.filter(pk=post_id).update(image_variants=variants)
+    return True
+
+
+def schedule_images(post):
+    """
+    Ставит обработку картинки в очередь после фиксации транзакции.
+    При THUMBNAIL_WORKERS = 0 картинка обрабатывается сразу, в том же
+    потоке, что удобно для тестов. Уже обработанная картинка не
+    обрабатывается повторно.
+    """
+    post_id, image_name = post.pk, post.image.name
+    if reuse_variants(post_id, image_name):
+        bump_feed_generation()
+        return
+    if getattr(post, '_previous_image', ''):
+        # Варианты прежней картинки к новой не подходят, а без ссылок
+        # их файлы уберёт collect_media.
+        Post.objects.filter(pk=post_id).update(image_variants='')
+        post.image_variants = ''
+
+    def run():
+        if settings.THUMBNAIL_WORKERS:
+            _get_executor().submit(prepare_images, post_id, image_name)
+        else:
+            prepare_images(post_id, image_name)
+
+    transaction.on_commit(run)
@@ -0,0 +1,120 @@
+"""
+Материализованная лента подписок (fan-out on write).
+
+Новый пост раскладывается по лентам подписчиков автора, подписка
+дозаполняет ленту постами автора, отписка их убирает. Посты авторов
+с большой аудиторией в ленты не пишутся: они подмешиваются при чтении
+(fan-out on read), чтобы один пост не порождал тысячи строк.
+"""
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+
+from .models import Follow, Post, TimelineEntry
+
+
+FANOUT_FOLLOWERS_LIMIT = 1000
+
+BATCH_SIZE = 500
+
+
+def is_fanout_on_read(author_id):
+    followers = Follow.objects.filter(author_id=author_id).count()
+    return followers > FANOUT_FOLLOWERS_LIMIT
+
+
+def _heavy_authors(follows=None):
+    """Авторы с подписчиками сверх порога — их посты читаются на лету."""
+    if follows is None:
+        follows = Follow.objects.all()
+    return follows.order_by().values('author').annotate(
+        total=Count('pk')
+    ).filter(total__gt=FANOUT_FOLLOWERS_LIMIT).values('author')
+
+
+def _fill(follows):
+    """Записи лент по подпискам: один запрос с соединением на посты."""
+    pairs = follows.filter(
+        author__posts__isnull=False
+    ).values_list('user_id', 'author__posts__pk')
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=post_id)
+            for user_id, post_id in pairs.iterator()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def fan_out_posts(posts):
+    """
+    Раскладывает новые посты по лентам подписчиков их авторов.
+    posts — пары (id поста, id автора).
+    """
+    by_author = {}
+    for post_id, author_id in posts:
+        by_author.setdefault(author_id, []).append(post_id)
+    follows = Follow.objects.filter(author_id__in=by_author)
+    follows = follows.exclude(
+        author__in=_heavy_authors(follows)
+    ).values_list('user_id', 'author_id')
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=post_id)
+            for user_id, author_id in follows.iterator()
+            for post_id in by_author[author_id]
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def fan_out_post(post):
+    fan_out_posts([(post.pk, post.author_id)])
+
+
+def backfill(user_id, author_id):
+    if is_fanout_on_read(author_id):
+        return
+    _fill(Follow.objects.filter(user_id=user_id, author_id=author_id))
+
+
+def remove(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+    # Пока у автора было больше FANOUT_FOLLOWERS_LIMIT подписчиков, его
+    # посты в ленты не писались. Вернувшись к порогу, он снова пишется
+    # в ленты, поэтому пропущенное дозаполняется один раз.
+    followers = Follow.objects.filter(author_id=author_id)
+    if followers.count() == FANOUT_FOLLOWERS_LIMIT:
+        _fill(followers)
+
+
+def rebuild(users=None):
+    """Пересобирает ленты заданных пользователей (по умолчанию всех)."""
+    entries = TimelineEntry.objects.all()
+    follows = Follow.objects.exclude(author__in=_heavy_authors())
+    if users is not None:
+        entries = entries.filter(user__in=users)
+        follows = follows.filter(user__in=users)
+    with transaction.atomic():
+        entries.delete()
+        _fill(follows)
+
+
+def fanout_on_read_authors(user):
+    """Авторы из подписок пользователя, чьи посты читаются на лету."""
+    followers = Follow.objects.filter(
+        author=OuterRef('author')
+    ).order_by().values('author').annotate(total=Count('pk')).values('total')
+    return Follow.objects.filter(user=user).annotate(
+        followers=Subquery(followers)
+    ).filter(followers__gt=FANOUT_FOLLOWERS_LIMIT).values('author')
+
+
+def get_timeline(user):
+    return Post.objects.for_feed().filter(
+        Q(pk__in=TimelineEntry.objects.filter(user=user).values('post'))
+        | Q(author__in=fanout_on_read_authors(user))
+    )
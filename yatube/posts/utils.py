@@ -1,11 +1,209 @@
-from django.core.paginator import Paginator
+import base64
+import hashlib
+import json
+from functools import wraps
+
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.http import HttpResponsePermanentRedirect
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
 
 
 POSTS_ON_PAGE = 10
 
+KEYSET_ORDERING = ('-pub_date', '-pk')
+
+APPROXIMATE_COUNT_CACHE_TIME = 60
+
+# Больший id не влезет в целочисленную колонку базы.
+MAX_PK = 2 ** 63 - 1
+
+COMMENTS_ON_PAGE = 50
+
+COMMENTS_ORDERING = ('-created', '-pk')
+
+
+def encode_cursor(obj, reverse=False, field='pub_date'):
+    """Непрозрачный токен позиции в ленте: (дата, id) и направление."""
+    payload = json.dumps([getattr(obj, field).isoformat(), obj.pk, reverse])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Разбирает токен курсора. Для испорченного токена, даты без часового
+    пояса или id вне диапазона вернёт None.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        pub_date, pk, reverse = json.loads(base64.urlsafe_b64decode(padded))
+        pub_date = parse_datetime(pub_date)
+    except (ValueError, TypeError):
+        return None
+    if pub_date is None or timezone.is_naive(pub_date):
+        return None
+    if not isinstance(pk, int) or not 0 < pk <= MAX_PK:
+        return None
+    return pub_date, pk, bool(reverse)
+
+
+class PageRedirect(Exception):
+    """Старая ссылка ?page=N: представление отвечает переадресацией."""
+
+    def __init__(self, url):
+        super().__init__(url)
+        self.url = url
+
+
+class CursorPaginator(Paginator):
+    """
+    Постраничный вывод по ключу (pub_date, id) без COUNT и OFFSET.
+    Номеров страниц нет, переходы только на соседние страницы: get_page
+    отдаёт обычный Page, чей номер и num_pages лишь говорят, есть ли
+    соседи. count — приближённое общее число записей (COUNT не чаще
+    раза в APPROXIMATE_COUNT_CACHE_TIME секунд) или None, если оно
+    не нужно.
+    """
+    keyset = True
+
+    def __init__(self, queryset, per_page, approximate_count=False):
+        super().__init__(queryset.order_by(*KEYSET_ORDERING), per_page)
+        self.approximate_count = approximate_count
+        self._num_pages = 1
+
+    @property
+    def num_pages(self):
+        return self._num_pages
+
+    @cached_property
+    def count(self):
+        if not self.approximate_count:
+            return None
+        query = str(self.object_list.query).encode()
+        key = 'approximate_count:' + hashlib.md5(query).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(key, count, APPROXIMATE_COUNT_CACHE_TIME)
+        return count
+
+    def get_page(self, token):
+        cursor = decode_cursor(token) if token else None
+        if cursor is None:
+            rows = self._fetch(self.object_list, KEYSET_ORDERING)
+            return self._page(
+                rows[:self.per_page], len(rows) > self.per_page, False
+            )
+
+        pub_date, pk, reverse = cursor
+        if reverse:
+            queryset = self.object_list.filter(
+                Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+            )
+            rows = self._fetch(queryset, ('pub_date', 'pk'))
+            return self._page(
+                rows[:self.per_page][::-1], True, len(rows) > self.per_page
+            )
+
+        queryset = self.object_list.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+        )
+        rows = self._fetch(queryset, KEYSET_ORDERING)
+        return self._page(
+            rows[:self.per_page], len(rows) > self.per_page, True
+        )
+
+    def _fetch(self, queryset, ordering):
+        return list(queryset.order_by(*ordering)[:self.per_page + 1])
+
+    def _page(self, rows, has_next, has_previous):
+        has_next = has_next and bool(rows)
+        has_previous = has_previous and bool(rows)
+        number = 2 if has_previous else 1
+        self._num_pages = number + 1 if has_next else number
+        page = Page(rows, number, self)
+        page.next_cursor = encode_cursor(rows[-1]) if has_next else None
+        page.previous_cursor = (
+            encode_cursor(rows[0], reverse=True) if has_previous else None
+        )
+        return page
+
+
+def legacy_page_url(queryset, request):
+    """
+    Адрес по курсору для старой ссылки ?page=N. Смещение считается
+    один раз ради переадресации; за пределами ленты — первая страница.
+    """
+    query = request.GET.copy()
+    page = query.pop('page')[-1]
+    try:
+        offset = (int(page) - 1) * POSTS_ON_PAGE - 1
+    except ValueError:
+        offset = -1
+    if offset >= 0:
+        last = queryset.select_related(None).only('pub_date').order_by(
+            *KEYSET_ORDERING
+        )[offset:offset + 1].first()
+        if last is not None:
+            query['cursor'] = encode_cursor(last)
+    return f'{request.path}?{query.urlencode()}' if query else request.path
+
+
+def redirect_legacy_pages(view):
+    """Отвечает переадресацией, если get_page_context подняла PageRedirect."""
+    @wraps(view)
+    def inner(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except PageRedirect as redirect:
+            return HttpResponsePermanentRedirect(redirect.url)
+
+    return inner
+
+
+def get_page_context(
+    queryset, request, keyset=False, approximate_count=False
+):
+    """
+    Страница ленты. При keyset=True все страницы обслуживает
+    CursorPaginator, а старые ссылки ?page=N переадресуются на курсор
+    (представление оборачивается в redirect_legacy_pages).
+    """
+    if keyset:
+        if 'page' in request.GET:
+            raise PageRedirect(legacy_page_url(queryset, request))
+        paginator = CursorPaginator(
+            queryset, POSTS_ON_PAGE, approximate_count
+        )
+        return paginator.get_page(request.GET.get('cursor'))
 
-def get_page_context(queryset, request):
     paginator = Paginator(queryset, POSTS_ON_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+    return paginator.get_page(request.GET.get('page'))
+
+
+def get_comments_page(post, token=None):
+    """
+    Порция комментариев к посту, от новых к старым, не больше
+    COMMENTS_ON_PAGE за запрос. Возвращает список и курсор следующей
+    порции (None, если она последняя).
+    """
+    queryset = post.comments.select_related('author').only(
+        'text', 'created', 'post_id', 'author__username'
+    )
+    cursor = decode_cursor(token) if token else None
+    if cursor is not None:
+        created, pk, _ = cursor
+        queryset = queryset.filter(
+            Q(created__lt=created) | Q(created=created, pk__lt=pk)
+        )
+    rows = list(
+        queryset.order_by(*COMMENTS_ORDERING)[:COMMENTS_ON_PAGE + 1]
+    )
+    comments = rows[:COMMENTS_ON_PAGE]
+    next_cursor = None
+    if len(rows) > COMMENTS_ON_PAGE:
+        next_cursor = encode_cursor(comments[-1], field='created')
+    return comments, next_cursor
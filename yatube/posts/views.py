@@ -1,19 +1,34 @@
+from urllib.parse import urlencode
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import (
+    HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+)
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
 
 from .models import Post, Group, User, Follow
+from .caching import cache_feed
+from .conditional import conditional, post_state
+from .exporter import FORMATS, RENDERERS, export_records, parse_moment
 from .forms import PostForm, CommentForm
-from .utils import get_page_context
+from .utils import (
+    get_comments_page, get_page_context, redirect_legacy_pages
+)
+from .search import SearchResults
+from .timeline import get_timeline
 
 
-TIME_OF_CACHE = 20
+TIME_OF_CACHE = 60 * 60
 
 
-@cache_page(TIME_OF_CACHE, key_prefix='index_page')
+@conditional()
+@cache_feed(TIME_OF_CACHE, key_prefix='index_page')
+@redirect_legacy_pages
 def index(request):
-    post_list = Post.objects.all()
-    page_obj = get_page_context(post_list, request)
+    post_list = Post.objects.for_feed()
+    page_obj = get_page_context(post_list, request, keyset=True)
     context = {
         'page_obj': page_obj,
         'title': 'Последние обновления на сайте'
@@ -21,10 +36,13 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@conditional()
+@cache_feed(TIME_OF_CACHE, key_prefix='group_page')
+@redirect_legacy_pages
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    group_post_list = group.posts.all()
-    page_obj = get_page_context(group_post_list, request)
+    group_post_list = group.posts.for_feed()
+    page_obj = get_page_context(group_post_list, request, keyset=True)
     context = {
         'group': group,
         'title': f'Записи сообщества {group}',
@@ -33,10 +51,17 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional()
+@cache_feed(TIME_OF_CACHE, key_prefix='profile_page')
+@redirect_legacy_pages
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    author_post_list = author.posts.all()
-    page_obj = get_page_context(author_post_list, request)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    author_post_list = author.posts.for_feed()
+    page_obj = get_page_context(
+        author_post_list, request, keyset=True, approximate_count=True
+    )
 
     context = {
         'title': f'Профайл пользователя {author.get_full_name()}',
@@ -52,20 +77,73 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = get_page_context(SearchResults(query) if query else [], request)
+    posts = Post.objects.for_feed().in_bulk(page_obj.object_list)
+    page_obj.object_list = [
+        posts[pk] for pk in page_obj.object_list if pk in posts
+    ]
+    context = {
+        'title': f'Поиск: {query}' if query else 'Поиск',
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@staff_member_required
+def export_content(request):
+    file_format = request.GET.get('format', 'jsonl')
+    if file_format not in FORMATS:
+        return HttpResponseBadRequest('Неизвестный формат')
+    try:
+        since = parse_moment(request.GET.get('since'))
+        until = parse_moment(request.GET.get('until'), end=True)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+
+    response = StreamingHttpResponse(
+        RENDERERS[file_format](export_records(since, until)),
+        content_type=f'{FORMATS[file_format]}; charset=utf-8'
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="posts.{file_format}"'
+    )
+    return response
+
+
+@conditional(post_state)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id
+    )
+    comments, next_cursor = get_comments_page(
+        post, request.GET.get('comments')
+    )
 
     form = CommentForm()
 
     context = {
         'post': post,
         'comments': comments,
+        'comments_cursor': next_cursor,
         'form': form
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    """Следующая порция комментариев: готовый HTML и курсор в JSON."""
+    post = get_object_or_404(Post.objects.only('pk'), id=post_id)
+    comments, next_cursor = get_comments_page(post, request.GET.get('cursor'))
+    html = render_to_string(
+        'includes/comment_list.html', {'comments': comments}, request
+    )
+    return JsonResponse({'html': html, 'next_cursor': next_cursor})
+
+
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
@@ -103,7 +181,7 @@ def post_create(request):
 def post_edit(request, post_id):
     is_edit = True
     post = get_object_or_404(Post, id=post_id)
-    if request.user != post.author:
+    if request.user.pk != post.author_id:
         return redirect('posts:post_detail', post_id)
 
     form = PostForm(
@@ -127,9 +205,10 @@ def post_edit(request, post_id):
 
 
 @login_required
+@redirect_legacy_pages
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = get_page_context(posts, request)
+    posts = get_timeline(request.user)
+    page_obj = get_page_context(posts, request, keyset=True)
     context = {'page_obj': page_obj}
     return render(request, 'posts/follow.html', context)
 
@@ -20,6 +20,14 @@ ALLOWED_HOSTS = [
     'testserver',
 ]
 
+INTERNAL_IPS = [
+    '127.0.0.1',
+]
+
+# /metrics/ открыт персоналу и сборщику с заголовком
+# «Authorization: Bearer <METRICS_TOKEN>»; пустой токен доступ не даёт.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 
 # Application definition
 
@@ -38,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,7 +62,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metrics.MeteredTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -73,11 +83,59 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Соединение живёт DB_CONN_MAX_AGE секунд и переиспользуется между
+# запросами; timeout — сколько ждать блокировку записи до ошибки.
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'OPTIONS': {
+            'timeout': 20,
+        },
+    }
+}
+
+# Реплики только для чтения: DB_REPLICAS — пути к копиям базы через
+# запятую. Ленты из REPLICA_VIEWS читаются с них, пока пользователь
+# ничего не записал; после записи его чтение REPLICA_PIN_SECONDS идёт
+# в основную базу. Локально реплики обновляет команда sync_replicas.
+
+DATABASE_REPLICAS = []
+
+for index, path in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1
+):
+    DATABASES[f'replica{index}'] = {
+        **DATABASES['default'],
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_REPLICAS.append(f'replica{index}')
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+REPLICA_VIEWS = [
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:follow_index',
+]
+
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+
+# PRAGMA, которые core.database выполняет на каждом новом соединении
+# SQLite. WAL позволяет читать ленты, пока идёт запись поста.
+
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'wal'),
+    'synchronous': 'normal',
+    'busy_timeout': 20000,
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
 }
 
 
@@ -134,8 +192,71 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Хранилище загрузок и миниатюр выбирается переменной MEDIA_STORAGE:
+# file (по умолчанию) или memory — файлы в памяти процесса для тестов
+# и замеров; MEMORY_STORAGE_MAX_SIZE ограничивает его объём в байтах.
+
+MEDIA_STORAGES = {
+    'file': 'django.core.files.storage.FileSystemStorage',
+    'memory': 'core.storage.MemoryStorage',
+}
+
+DEFAULT_FILE_STORAGE = MEDIA_STORAGES[os.getenv('MEDIA_STORAGE', 'file')]
+
+THUMBNAIL_STORAGE = DEFAULT_FILE_STORAGE
+
+MEMORY_STORAGE_MAX_SIZE = (
+    int(os.getenv('MEMORY_STORAGE_MAX_SIZE'))
+    if os.getenv('MEMORY_STORAGE_MAX_SIZE') else None
+)
+
+# Потоки фоновой обработки картинок постов; 0 — обрабатывать синхронно.
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 2))
+
+THUMBNAIL_KVSTORE = 'core.thumbnail_kvstore.CachedDBKVStore'
+
+# Cache
+# Бэкенд выбирается переменной окружения CACHE_BACKEND:
+# locmem (по умолчанию), file, memcached, redis или fake — заглушка
+# Redis внутри процесса для тестов.
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    },
+    'memcached': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': '127.0.0.1:11211',
+    },
+    'redis': {
+        'BACKEND': 'core.cache.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/0',
+        'OPTIONS': {
+            'MAX_CONNECTIONS': int(os.getenv('CACHE_MAX_CONNECTIONS', 10)),
+        },
+    },
+    'fake': {
+        'BACKEND': 'core.cache.RedisCache',
+        'LOCATION': 'fake://',
+    },
+}
+
+CACHE = {
+    **CACHE_BACKENDS[os.getenv('CACHE_BACKEND', 'locmem')],
+    'KEY_PREFIX': os.getenv('CACHE_KEY_PREFIX', 'yatube'),
+    'VERSION': int(os.getenv('CACHE_VERSION', 1)),
+}
+if os.getenv('CACHE_LOCATION'):
+    CACHE['LOCATION'] = os.getenv('CACHE_LOCATION')
+
+# Выбранный бэкенд в обёртке, которая считает попадания для /metrics/.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.metrics.MeteredCache',
+        'OPTIONS': {'CACHE': CACHE},
     }
 }
@@ -3,6 +3,8 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import media, metrics
+
 
 handler403 = 'core.views.page_not_found'
 handler404 = 'core.views.page_not_found'
@@ -15,9 +17,16 @@ urlpatterns = [
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
     path('admin/', admin.site.urls),
+    path('metrics/', metrics, name='metrics'),
 ]
 
-if settings.DEBUG:
+if settings.DEBUG and settings.DEFAULT_FILE_STORAGE != (
+    settings.MEDIA_STORAGES['file']
+):
+    urlpatterns.append(
+        path(f'{settings.MEDIA_URL.lstrip("/")}<path:path>', media)
+    )
+elif settings.DEBUG:
     urlpatterns += static(
         settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
     )